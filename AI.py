@@ -1,73 +1,182 @@
+import time
+# Every rerun executes this whole file; its duration is recorded at the end
+SCRIPT_STARTED = time.perf_counter()
 import streamlit as st
-from fpdf import FPDF
-try:
-    import ollama
-    OLLAMA_AVAILABLE = True
-except Exception:
-    # Ollama may not be available in hosted environments (Streamlit Cloud)
-    ollama = None
-    OLLAMA_AVAILABLE = False
+import functools
 import os
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except Exception:
-    genai = None
-    GEMINI_AVAILABLE = False
+import uuid
 from PIL import Image
-import pytesseract
-import pdfplumber
+import history_view
+import jobs
+import metrics
+import pdf_ingest
+import preprocess
+import session_store
+import theme
+from backends import GEMINI_AVAILABLE, OLLAMA_AVAILABLE, OLLAMA_KEEP_ALIVE, ClientRegistry, ModelWarmer
+from context_window import ContextWindow
+from ocr import CACHE_DIR, CACHE_PATH, OCRCache, cache_key, ocr_settings
+from ocr_engines import current_engine, set_tesseract_cmd, tesseract_cmd
+from report import SessionReport
+from response_cache import RESPONSE_CACHE_ENABLED, ResponseCache
+from retrieval import BM25Index
+from router import DEFAULT_POLICY, POLICIES, GeminiBackend, NoBackendAvailable, OllamaBackend, Router
+from scheduler import RequestScheduler
+from streaming import CancelToken, GenerationCancelled, StreamRenderer
 
 # ================== CONFIG ==================
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+set_tesseract_cmd(r"C:\Program Files\Tesseract-OCR\tesseract.exe")
 MODEL = "gemma3:1b"
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+PDF_OCR_RESOLUTION = pdf_ingest.DEFAULT_RESOLUTION
+# Pick the DPI per page (PDF_OCR_RESOLUTION is the maximum), skip blank pages and
+# OCR large images on pages that have a text layer
+PDF_ADAPTIVE_RENDERING = True
+# Uploaded documents are indexed locally; only the most relevant chunks go to the model
+RETRIEVAL_TOP_K = 4
+RETRIEVAL_TOKEN_BUDGET = 1500
+# Whole-conversation payload cap; older turns beyond it are summarized
+CONTEXT_TOKEN_BUDGET = 4000
+
+@st.cache_resource
+def get_clients():
+    # Long-lived model clients shared by every session (pooled HTTP connections)
+    return ClientRegistry()
+
+@st.cache_resource
+def get_model_warmer():
+    # Preload MODEL once per process in the background so the first message doesn't pay for it
+    warmer = ModelWarmer(get_clients(), MODEL, keep_alive=OLLAMA_KEEP_ALIVE)
+    if OLLAMA_AVAILABLE:
+        warmer.start()
+    return warmer
+
+@st.cache_resource
+def get_router():
+    # Health and latency stats are shared by every session in the process
+    backends = []
+    if OLLAMA_AVAILABLE:
+        backends.append(OllamaBackend(get_clients(), MODEL, keep_alive=OLLAMA_KEEP_ALIVE))
+    if GEMINI_AVAILABLE:
+        backends.append(GeminiBackend(get_clients(), GEMINI_MODEL))
+    return Router(backends)
+
+@st.cache_resource
+def get_scheduler():
+    # Bounds concurrent model streams across every browser session in this process
+    return RequestScheduler()
+
+@st.cache_resource
+def get_response_cache():
+    # Complete answers to repeated prompts, shared by every session (opt-in in the sidebar)
+    return ResponseCache()
+
+@st.cache_resource
+def get_metrics():
+    # One registry per process: Prometheus text file in the cache dir; JSONL log only if asked for
+    return metrics.configure(
+        log_path=metrics.METRICS_LOG,
+        prom_path=metrics.METRICS_FILE or os.path.join(CACHE_DIR, "metrics.prom"),
+        port=metrics.METRICS_PORT,
+    )
 
-def create_pdf(messages):
-    class PDF(FPDF):
-        def header(self):
-            self.set_font('Arial', 'B', 15)
-            self.cell(0, 10, 'DebAI Session Report', 0, 1, 'C')
-            self.ln(10)
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('Arial', 'I', 8)
-            self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
-
-    pdf = PDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    
-    for msg in messages:
-        if msg["role"] == "system":
+@st.cache_resource
+def get_ocr_cache():
+    # Shared by every session in this process; persisted on disk across restarts
+    cache = OCRCache(CACHE_PATH)
+    cache.prune()
+    return cache
+
+@st.cache_resource
+def get_session_store():
+    # Large message and document texts of every session, stored once by content hash
+    store = session_store.BlobStore(os.path.join(CACHE_DIR, "sessions.sqlite3"))
+    store.prune()
+    return store
+
+@st.cache_resource
+def get_preprocess_cache():
+    # Prepared (scaled, binarized) images in memory, reused when an upload is OCR'd again
+    # without an OCR cache hit (a retry, another engine)
+    return preprocess.ProcessedImageCache()
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def preview_thumbnail(file_id, _data, max_side=1024):
+    # Keyed by the upload's id, not its bytes; large scans are never sent to the browser whole
+    return preprocess.thumbnail(_data, max_side)
+
+@st.cache_resource
+def get_pdf_executor(workers):
+    # One process pool per worker-count setting, shared by every session
+    return pdf_ingest.make_executor(workers)
+
+@st.cache_resource
+def get_ocr_jobs():
+    # Background OCR shared by every session; results land in the OCR cache
+    return jobs.OCRJobManager(cache=get_ocr_cache())
+
+@st.fragment(run_every=1.0)
+def ocr_batch_status(job_ids):
+    # Refreshes on its own while jobs run, so the rest of the page (and the chat) stays usable
+    batch_jobs = [j for j in (get_ocr_jobs().get(i) for i in job_ids) if j is not None]
+    if all(j.finished for j in batch_jobs):
+        # a full rerun attaches the result to the conversation
+        st.rerun()
+    files_done = sum(1 for j in batch_jobs if j.finished)
+    progress = [j.progress() for j in batch_jobs]
+    pages_done = sum(done for done, _ in progress)
+    pages_total = sum(total for _, total in progress)
+    st.progress(
+        pages_done / max(pages_total, 1),
+        text=(
+            f"Reading in the background — {files_done}/{len(batch_jobs)} files, "
+            f"{pages_done}/{pages_total} pages. You can already ask about the pages read so far."
+        ),
+    )
+    for job in batch_jobs:
+        # read once: the job drops its builder when it finishes
+        builder = job.builder
+        if job.finished or builder is None:
             continue
-        role = msg["role"].upper()
-        content = msg["content"]
-        # Simple sanitization for latin-1
-        content = content.encode('latin-1', 'replace').decode('latin-1')
-        
-        if role == "USER":
-            pdf.set_text_color(59, 130, 246) # Blue
-        else:
-            pdf.set_text_color(100, 100, 100) # Gray
-            
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, txt=f"{role}:", ln=True)
-        
-        pdf.set_text_color(0, 0, 0)
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, txt=content)
-        pdf.ln(5)
-        
-    return pdf.output(dest='S').encode('latin-1')
-
-# Load favicon if available
-favicon = "💬"
-if os.path.exists("pic.png"):
-    try:
-        favicon = Image.open("pic.png")
-    except Exception:
-        pass
+        # Preview the most recent pages that are ready in page order
+        ready = [r for r in builder.contiguous() if r.text]
+        if ready:
+            with st.container(height=300):
+                for result in ready[-3:]:
+                    st.markdown(f"**{job.name} — page {result.index + 1}**")
+                    st.text(result.text)
+
+def markdown_table(rows):
+    # The sidebar tables are rendered as Markdown: st.dataframe would import pandas
+    # (most of a second) on the first run of every process
+    if not rows:
+        return ""
+    header = list(rows[0])
+    lines = ["| " + " | ".join(header) + " |", "|" + " --- |" * len(header)]
+    for row in rows:
+        cells = ["" if row[k] is None else str(row[k]).replace("|", "\\|") for k in header]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+@st.cache_resource(show_spinner=False)
+def load_assets():
+    # Favicon and header logo are looked up and read once per process, not on every rerun
+    favicon = "💬"
+    if os.path.exists("pic.png"):
+        try:
+            favicon = Image.open("pic.png")
+            favicon.load()
+        except Exception:
+            favicon = "💬"
+    logo = None
+    for path in ("assets/logo.png", "logo.png"):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                logo = f.read()
+            break
+    return favicon, logo
+
+favicon, logo_image = load_assets()
 
 st.set_page_config(
     page_title="DebAI",
@@ -85,344 +194,11 @@ def toggle_theme():
     else:
         st.session_state.theme = "dark"
 
-# Define theme colors
-if st.session_state.theme == "dark":
-    # 🌑 DARK MODE — “FOCUSED · FUTURISTIC · CINEMATIC”
-    dark_bg_image = """
-        radial-gradient(circle at 15% 50%, rgba(79, 70, 229, 0.15), transparent 40%),
-        radial-gradient(circle at 85% 30%, rgba(59, 130, 246, 0.15), transparent 40%),
-        linear-gradient(180deg, #020617 0%, #0f172a 50%, #1e293b 100%)
-    """
-    
-    css_vars = f"""
-    --bg-color: #020617;
-    --card-bg: rgba(255, 255, 255, 0.08);
-    --chat-bg: rgba(255, 255, 255, 0.08);
-    --chat-user-bg: rgba(59, 130, 246, 0.15);
-    --chat-assistant-bg: rgba(255, 255, 255, 0.05);
-    --accent: #60a5fa;
-    --accent-glow: rgba(96, 165, 250, 0.4);
-    --text-primary: #f1f5f9;
-    --text-secondary: #94a3b8;
-    --border-color: rgba(255, 255, 255, 0.1);
-    --sidebar-bg: #020617;
-    --app-bg: {dark_bg_image};
-    --glass-blur: 25px;
-    --card-shadow: 0 8px 32px 0 rgba(0, 0, 0, 0.3);
-    --logo-bg: rgba(59, 130, 246, 0.15);
-    --logo-border: rgba(59, 130, 246, 0.3);
-    --bg-anim: orbFloat 40s ease-in-out infinite alternate;
-    """
-    btn_label = "☀️ Light Mode"
-else:
-    # 🌕 LIGHT MODE — “CLEAN · AIRY · APPLE-LEVEL POLISH”
-    light_bg_image = """
-        radial-gradient(circle at 0% 0%, rgba(219, 234, 254, 0.6), transparent 50%),
-        radial-gradient(circle at 100% 100%, rgba(237, 233, 254, 0.6), transparent 50%),
-        linear-gradient(180deg, #ffffff 0%, #f8fafc 100%)
-    """
-
-    css_vars = f"""
-    --bg-color: #ffffff;
-    --card-bg: rgba(255, 255, 255, 0.65);
-    --chat-bg: rgba(255, 255, 255, 0.65);
-    --chat-user-bg: rgba(59, 130, 246, 0.08);
-    --chat-assistant-bg: rgba(255, 255, 255, 0.5);
-    --accent: #2563eb;
-    --accent-glow: rgba(37, 99, 235, 0.15);
-    --text-primary: #0f172a;
-    --text-secondary: #475569;
-    --border-color: rgba(203, 213, 225, 0.6);
-    --sidebar-bg: rgba(255, 255, 255, 0.85);
-    --app-bg: {light_bg_image};
-    --glass-blur: 20px;
-    --card-shadow: 0 10px 40px -10px rgba(0, 0, 0, 0.08);
-    --logo-bg: rgba(37, 99, 235, 0.05);
-    --logo-border: rgba(37, 130, 235, 0.1);
-    --bg-anim: orbFloat 60s ease-in-out infinite alternate;
-    """
-    btn_label = "🌙 Dark Mode"
+# Stylesheets for both themes are built once per process (see theme.py)
+btn_label = theme.TOGGLE_LABELS[st.session_state.theme]
 
 # ================== STYLED UI CSS ==================
-cyberpunk_css = f"""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600;800&display=swap');
-
-:root {{
-    {css_vars}
-}}
-
-html, body, .stApp {{
-    font-family: 'Inter', 'Segoe UI', system-ui, -apple-system, Roboto, 'Helvetica Neue', Arial;
-    background-color: var(--bg-color);
-    color: var(--text-primary);
-}}
-
-/* Main Background with Noise */
-.stApp {{
-    background-color: var(--bg-color);
-    background-image: var(--app-bg);
-    background-attachment: fixed;
-    background-size: 120% 120%;
-    animation: var(--bg-anim);
-}}
-
-/* Subtle Noise Overlay */
-.stApp::before {{
-    content: "";
-    position: fixed;
-    top: 0; left: 0; width: 100%; height: 100%;
-    background-image: url("data:image/svg+xml,%3Csvg viewBox='0 0 200 200' xmlns='http://www.w3.org/2000/svg'%3E%3Cfilter id='noiseFilter'%3E%3CfeTurbulence type='fractalNoise' baseFrequency='0.65' numOctaves='3' stitchTiles='stitch'/%3E%3C/filter%3E%3Crect width='100%25' height='100%25' filter='url(%23noiseFilter)' opacity='0.03'/%3E%3C/svg%3E");
-    pointer-events: none;
-    z-index: 0;
-}}
-
-@keyframes orbFloat {{
-    0% {{ background-position: 0% 0%; }}
-    100% {{ background-position: 20% 10%; }}
-}}
-
-/* Loader Animation */
-@keyframes spin {{
-    0% {{ transform: rotate(0deg); }}
-    100% {{ transform: rotate(360deg); }}
-}}
-
-.loader {{
-    border: 3px solid rgba(128, 128, 128, 0.2);
-    border-top: 3px solid var(--accent);
-    border-radius: 50%;
-    width: 24px;
-    height: 24px;
-    animation: spin 1s linear infinite;
-    display: inline-block;
-    box-sizing: border-box;
-}}
-
-.block-container {{
-    padding: 6rem 2rem 4rem 2rem !important;
-    max-width: 1200px;
-    margin: 0 auto;
-    position: relative;
-    z-index: 1;
-}}
-
-/* Text Colors */
-h1, h2, h3, h4, h5, h6, p, span, div, label, .stMarkdown, .stText, .stButton, a {{
-    color: var(--text-primary) !important;
-}}
-
-.debai-subtitle, .stMarkdown p {{
-    color: var(--text-secondary) !important;
-}}
-
-/* Ultimate Glass Card */
-.deb-card {{
-    background: var(--card-bg);
-    backdrop-filter: blur(var(--glass-blur));
-    -webkit-backdrop-filter: blur(var(--glass-blur));
-    border: 1px solid var(--border-color);
-    border-top: 1px solid rgba(255, 255, 255, 0.15);
-    border-radius: 24px;
-    padding: 2rem;
-    box-shadow: var(--card-shadow);
-    margin-bottom: 1.5rem;
-    position: relative;
-    z-index: 1;
-    transition: background 0.5s ease, backdrop-filter 0.5s ease, box-shadow 0.5s ease, border-color 0.5s ease;
-}}
-
-.stTabs {{
-    margin-top: 1rem;
-}}
-
-/* Header */
-.debai-title {{
-    font-size: 2.5rem;
-    font-weight: 800;
-    background: linear-gradient(135deg, var(--accent) 0%, #a78bfa 100%);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-    margin-bottom: 0.5rem;
-    text-shadow: 0 0 30px var(--accent-glow);
-    transition: all 0.5s ease;
-}}
-
-.debai-subtitle {{
-    margin-top: 0;
-    font-size: 0.95rem;
-    color: var(--text-secondary);
-    margin-bottom: 1.25rem;
-}}
-
-.debai-header {{
-    display:flex;align-items:center;gap:12px;margin-bottom:8px;
-}}
-
-.debai-logo {{
-    width:44px;height:44px;
-    background: var(--logo-bg);
-    border: 1px solid var(--logo-border);
-    box-shadow: 0 0 20px var(--accent-glow);
-    border-radius: 16px;
-    padding: 8px;
-    display:inline-flex;align-items:center;justify-content:center;
-    transition: all 0.5s ease;
-}}
-.debai-logo svg {{
-    width:24px;height:24px;
-    fill: var(--accent);
-    transition: fill 0.5s ease;
-}}
-
-/* Sidebar */
-section[data-testid='stSidebar'] {{
-    background-color: var(--sidebar-bg);
-    border-right: 1px solid var(--border-color);
-    transition: background-color 0.5s ease, border-color 0.5s ease;
-}}
-section[data-testid='stSidebar'] .stMarkdown, 
-section[data-testid='stSidebar'] label,
-section[data-testid='stSidebar'] .stCheckbox,
-section[data-testid='stSidebar'] .css-1l02y0g {{
-    color: var(--text-secondary) !important;
-}}
-section[data-testid='stSidebar'] svg {{
-    fill: var(--text-secondary) !important;
-}}
-
-/* Expander */
-div[data-testid="stExpander"] details summary {{
-    color: var(--text-primary) !important;
-    background-color: var(--card-bg);
-    border: 1px solid var(--border-color);
-    border-radius: 12px;
-    backdrop-filter: blur(10px);
-    transition: all 0.3s ease;
-}}
-div[data-testid="stExpander"] details summary:hover {{
-    color: var(--accent) !important;
-    background-color: rgba(255, 255, 255, 0.1);
-}}
-div[data-testid="stExpander"] details {{
-    border-color: var(--border-color);
-}}
-
-/* Chat Bubbles - Ultimate Glass */
-.stChatMessage {{
-    background: var(--chat-bg);
-    backdrop-filter: blur(var(--glass-blur));
-    -webkit-backdrop-filter: blur(var(--glass-blur));
-    border: 1px solid var(--border-color);
-    border-radius: 20px !important;
-    padding: 1.25rem !important;
-    box-shadow: 0 4px 20px rgba(0, 0, 0, 0.05);
-    font-size: 1rem;
-    margin-bottom: 16px;
-    position: relative;
-    z-index: 1;
-    transition: background 0.5s ease, border-color 0.5s ease, backdrop-filter 0.5s ease;
-}}
-
-.stChatMessage[data-testid="stChatMessage-user"] {{
-    background: var(--chat-user-bg);
-    border: 1px solid var(--accent);
-    color: var(--text-primary);
-}}
-.stChatMessage[data-testid="stChatMessage-assistant"] {{
-    background: var(--chat-assistant-bg);
-    border: 1px solid var(--border-color);
-    color: var(--text-primary);
-}}
-
-/* Buttons & Inputs */
-.stButton button, .stDownloadButton button {{
-    background: linear-gradient(135deg, #3B82F6 0%, #2563EB 100%);
-    color: white !important;
-    border: none;
-    border-radius: 8px;
-    font-weight: 600;
-    transition: all 0.3s ease;
-}}
-.stButton button:hover, .stDownloadButton button:hover {{
-    box-shadow: 0 0 15px var(--accent-glow);
-    transform: translateY(-1px);
-    color: white !important;
-}}
-
-/* Send OCR Button */
-.send-ocr-btn {{
-    display: inline-block;
-    padding: 8px 16px;
-    border-radius: 8px;
-    background: rgba(59, 130, 246, 0.15);
-    color: var(--accent) !important;
-    font-weight: 600;
-    text-decoration: none;
-    border: 1px solid rgba(59, 130, 246, 0.3);
-    transition: all 0.2s;
-}}
-.send-ocr-btn:hover {{
-    background: rgba(59, 130, 246, 0.25);
-    box-shadow: 0 0 10px var(--accent-glow);
-}}
-
-/* Custom Scrollbar */
-::-webkit-scrollbar {{
-    width: 8px;
-    height: 8px;
-}}
-::-webkit-scrollbar-track {{
-    background: transparent;
-}}
-::-webkit-scrollbar-thumb {{
-    background: var(--border-color);
-    border-radius: 4px;
-}}
-::-webkit-scrollbar-thumb:hover {{
-    background: var(--accent);
-}}
-
-/* Text Input & Text Area */
-.stTextInput input, .stTextArea textarea {{
-    background-color: var(--card-bg) !important;
-    color: var(--text-primary) !important;
-    border: 1px solid var(--border-color) !important;
-    border-radius: 12px !important;
-    padding: 12px !important;
-    backdrop-filter: blur(var(--glass-blur));
-    transition: all 0.3s ease;
-}}
-.stTextInput input:focus, .stTextArea textarea:focus {{
-    border-color: var(--accent) !important;
-    box-shadow: 0 0 15px var(--accent-glow) !important;
-}}
-
-/* Small responsive tweaks */
-@media (max-width: 760px) {{
-    .debai-title {{ font-size: 1.6rem; }}
-    .block-container {{ padding-left: 1rem !important; padding-right:1rem !important; }}
-}}
-
-/* File Uploader Fixes */
-[data-testid='stFileUploader'] section {{
-    background-color: var(--card-bg) !important;
-    border: 1px dashed var(--border-color) !important;
-}}
-[data-testid='stFileUploader'] section > div {{
-    color: var(--text-secondary) !important;
-}}
-[data-testid='stFileUploader'] section small {{
-    color: var(--text-secondary) !important;
-}}
-[data-testid='stFileUploader'] button {{
-    background-color: var(--accent) !important;
-    color: white !important;
-    border: none !important;
-}}
-</style>
-"""
-st.markdown(cyberpunk_css, unsafe_allow_html=True)
+st.markdown(theme.PAGE_CSS[st.session_state.theme], unsafe_allow_html=True)
 
 # ================== SIDEBAR ==================
 with st.sidebar:
@@ -430,22 +206,138 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("**Model in use:**")
     st.markdown(f"`{MODEL}`")
+    if OLLAMA_AVAILABLE:
+        model_warmer = get_model_warmer()
+        model_state = model_warmer.status()
+        if model_state == "ready":
+            loaded_in = f" (loaded in {model_warmer.load_seconds:.1f}s)" if model_warmer.load_seconds else ""
+            st.markdown(f"🟢 Ready{loaded_in}")
+        elif model_state == "loading":
+            st.markdown("🟡 Loading model…")
+        elif model_state == "cold":
+            st.markdown("⚪ Not loaded")
+        else:
+            st.markdown("🔴 Ollama unreachable", help=model_warmer.error)
     st.markdown("**Capabilities:**")
     st.markdown("- 🖼 Image OCR\n- 📄 PDF OCR\n- 💬 Intelligent Chat")
     st.markdown("---")
     # Toggle: auto-send OCR outputs to the model
     auto_send_ocr = st.checkbox("Auto-send OCR to model", value=True, help="When enabled, OCR text (image/PDF) is sent to the model automatically. When disabled, OCR text is only appended to chat and you can send it manually.")
     st.session_state.setdefault("auto_send_ocr", auto_send_ocr)
+    with st.expander("⚡ Performance settings"):
+        routing_policy = st.selectbox(
+            "Backend routing",
+            POLICIES,
+            index=POLICIES.index(DEFAULT_POLICY) if DEFAULT_POLICY in POLICIES else 0,
+            help="prefer-local: Ollama first. fastest: lowest measured time to first token. cost: cheapest first. Unhealthy backends are tried last.",
+        )
+        context_budget = st.number_input(
+            "Conversation context budget (tokens)",
+            min_value=500,
+            max_value=128000,
+            value=CONTEXT_TOKEN_BUDGET,
+            step=250,
+            help="Recent turns are sent verbatim up to this size; older turns are folded into a running summary.",
+        )
+        retrieval_budget = st.number_input(
+            "Document context budget (tokens)",
+            min_value=200,
+            max_value=32000,
+            value=RETRIEVAL_TOKEN_BUDGET,
+            step=100,
+            help="Maximum number of tokens of uploaded-document excerpts sent with each message.",
+        )
+        retrieval_top_k = st.slider("Document excerpts per message", 1, 12, RETRIEVAL_TOP_K)
+        pdf_workers = st.number_input(
+            "PDF worker processes",
+            min_value=1,
+            max_value=max(pdf_ingest.DEFAULT_WORKERS, 32),
+            value=pdf_ingest.DEFAULT_WORKERS,
+            help="Number of processes used to extract and OCR PDF pages in parallel. 1 processes pages inline.",
+        )
+        use_response_cache = st.checkbox(
+            "Reuse answers to repeated prompts",
+            value=RESPONSE_CACHE_ENABLED,
+            help="Replay a cached answer when exactly the same conversation and question were answered before by the same model.",
+        )
+        preprocess_images = st.checkbox(
+            "Preprocess images before OCR",
+            value=True,
+            help="Scale large photos and scans down to a size Tesseract reads well, convert to grayscale and binarize. Much faster on phone photos.",
+        )
+        deskew_images = st.checkbox(
+            "Straighten skewed scans",
+            value=False,
+            disabled=not preprocess_images,
+            help="Detect and correct small rotations (up to 5°) before OCR. Adds a little time per image.",
+        )
+        preprocess_options = preprocess.options(deskew=deskew_images) if preprocess_images else None
     if not OLLAMA_AVAILABLE:
         st.warning("Ollama client not available in this environment — model responses will be disabled. You can still use OCR features.")
+    with st.expander("🩺 Backend health"):
+        st.markdown(markdown_table(get_router().snapshot()))
+        sched = get_scheduler().stats()
+        st.caption(
+            f"Model slots: {sched['active']}/{sched['max_concurrent']} busy · {sched['queued']} queued · "
+            f"avg wait {sched['avg_wait_seconds']:.1f}s"
+        )
+    ocr_stats = get_ocr_cache().stats()
+    st.caption(
+        f"OCR cache: {ocr_stats['hits']} hits ({ocr_stats['disk_hits']} from disk) · "
+        f"{ocr_stats['misses']} misses · {ocr_stats['hit_rate']:.0%} hit rate"
+    )
+    if use_response_cache:
+        resp_stats = get_response_cache().stats()
+        st.caption(
+            f"Response cache: {resp_stats['hits']} hits · {resp_stats['hit_rate']:.0%} hit rate · "
+            f"{resp_stats['saved_seconds']:.1f}s saved"
+        )
+    store_stats = get_session_store().stats()
+    st.caption(
+        f"Session store: {store_stats['hot_mb']:.1f} MB in memory · {store_stats['disk_items']} texts, "
+        f"{store_stats['disk_mb']:.1f} MB on disk · {store_stats['duplicates']} duplicates shared"
+    )
+    engine = current_engine()
+    if engine is None:
+        # created (and the OCR library imported) on the first upload
+        st.caption("OCR engine: loads on first upload")
+    elif engine.persistent:
+        st.caption(f"OCR engine: {engine.name} (kept loaded, up to {engine.size} at once)")
+    else:
+        st.caption(f"OCR engine: {engine.name}", help=engine.fallback_reason)
+    latency = get_metrics().summary()
+    if latency:
+        with st.expander("⏱ Latency"):
+            st.markdown(markdown_table([
+                {
+                    "stage": row["metric"].replace("_seconds", ""),
+                    "labels": row["labels"],
+                    "n": row["count"],
+                    "p50": round(row["p50"], 3),
+                    "p95": round(row["p95"], 3),
+                    "last": round(row["last"], 3),
+                }
+                for row in latency
+            ]))
+            st.caption("Seconds, except tokens_per_second.")
+    window = st.session_state.get("context_window")
+    if window is not None and window.last_tokens:
+        st.caption(
+            f"Last payload: ~{window.last_tokens} tokens · "
+            f"{window.summarized_upto} earlier messages summarized"
+        )
 
     st.markdown("---")
     if len(st.session_state.get("messages", [])) > 0:
         st.markdown("### 📥 Export Chat")
-        pdf_data = create_pdf(st.session_state["messages"])
+        # Built only when the button is clicked (on Streamlit's download thread), from a
+        # snapshot of the messages; the per-session report re-lays out only new messages
+        report = st.session_state.setdefault("session_report", SessionReport())
+        messages_snapshot = list(st.session_state["messages"])
+        message_text_of = functools.partial(session_store.message_text, store=get_session_store())
         st.download_button(
             label="Download Report (PDF)",
-            data=pdf_data,
+            data=lambda: report.build(messages_snapshot, message_text_of),
             file_name="debai_report.pdf",
             mime="application/pdf"
         )
@@ -478,7 +370,256 @@ if "is_generating" not in st.session_state:
 if "current_response" not in st.session_state:
     st.session_state["current_response"] = ""
 if "last_ocr" not in st.session_state:
-    st.session_state["last_ocr"] = ""
+    # the last OCR message in the conversation (its text may live in the session store)
+    st.session_state["last_ocr"] = None
+run_kind = "rerun"
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+    run_kind = "session_start"
+if "ocr_batches" not in st.session_state:
+    # upload batches of this session: background OCR job IDs, attached once all finish
+    st.session_state["ocr_batches"] = []
+if "upload_keys" not in st.session_state:
+    # cache key per (uploader file_id, OCR settings), so each upload is read and hashed once
+    # rather than on every rerun while its batch is on screen
+    st.session_state["upload_keys"] = {}
+if "ingested_docs" not in st.session_state:
+    # content hashes of files already added to the chat, so reruns and later batches
+    # that include them again (a file added to or removed from the uploader) don't re-append them
+    st.session_state["ingested_docs"] = set()
+if "doc_index" not in st.session_state:
+    st.session_state["doc_index"] = BM25Index(store=get_session_store())
+if "partial_docs" not in st.session_state:
+    # files still being OCR'd: pages indexed so far and the index entries holding them
+    st.session_state["partial_docs"] = {}
+if "context_window" not in st.session_state:
+    st.session_state["context_window"] = ContextWindow()
+if "history_pages" not in st.session_state:
+    # "load earlier" pages of chat history shown above the recent window
+    st.session_state["history_pages"] = 0
+    # indices of large messages the user expanded beyond their preview
+    st.session_state["expanded_messages"] = set()
+
+def add_message(msg):
+    # Long texts move to the session store; the message keeps a preview and a ref
+    st.session_state["messages"].append(session_store.compact(msg, get_session_store()))
+    return msg
+
+def message_text(msg):
+    return session_store.message_text(msg, get_session_store())
+
+def ingest_ocr_text(doc_keys, text):
+    # Returns True only the first time a given set of files is added to the conversation
+    if all(k in st.session_state["ingested_docs"] for k in doc_keys):
+        return False
+    st.session_state["ingested_docs"].update(doc_keys)
+    doc_key = jobs.batch_key(doc_keys)
+    # the pages indexed while the files were being read are replaced by the whole text
+    drop_ready_pages(doc_keys)
+    st.session_state["doc_index"].add_document(doc_key, text)
+    # append extracted text as user message; "doc" marks it so the payload sends excerpts instead
+    msg = add_message({"role": "user", "content": text, "doc": doc_key})
+    # save last OCR for manual hotkey send
+    st.session_state["last_ocr"] = msg
+    return True
+
+def build_messages_payload():
+    # Documents are replaced by a short stub in the history; the latest turn carries
+    # only the excerpts that fit in the retrieval budget.
+    index = st.session_state["doc_index"]
+    history = st.session_state["messages"]
+    payload = []
+    for m in history[:-1]:
+        if m.get("doc"):
+            payload.append({"role": m["role"], "content": "[Uploaded document — relevant excerpts are included with later questions]"})
+        else:
+            payload.append({"role": m["role"], "content": message_text(m)})
+    if not history:
+        return payload
+    last = history[-1]
+    content = message_text(last)
+    if last.get("doc"):
+        chunks = index.leading_chunks(last["doc"], retrieval_budget)
+        if chunks:
+            content = "Uploaded document (excerpt):\n\n" + "\n\n".join(c.text for c in chunks)
+    elif last["role"] == "user":
+        chunks = index.select(content, retrieval_budget, retrieval_top_k)
+        if chunks:
+            excerpts = "\n\n".join(c.text for c in chunks)
+            content = f"Relevant excerpts from uploaded documents:\n\n{excerpts}\n\nQuestion: {content}"
+    payload.append({"role": last["role"], "content": content})
+    window = st.session_state["context_window"]
+    window.max_tokens = context_budget
+    return window.fit(payload)
+
+def format_stream_stats(stats):
+    if stats.get("cache_hit"):
+        return f"cached answer from {stats['backend']} · saved {stats['saved_seconds']:.1f}s"
+    if stats.get("cancelled"):
+        return f"stopped after {stats['stream_seconds']:.1f}s · {stats['tokens']} tokens kept"
+    first = stats.get("first_chunk_seconds")
+    first_text = f"first token {first:.2f}s · " if first is not None else ""
+    text = f"{first_text}{stats['tokens_per_sec']:.1f} tokens/s · {stats['stream_seconds']:.1f}s"
+    if stats.get("queue_seconds", 0) > 0.05:
+        text += f" · queued {stats['queue_seconds']:.1f}s"
+    # anything above a few ms means the model had to be loaded for this turn
+    if stats.get("load_seconds", 0) > 0.05:
+        text += f" · cold start {stats['load_seconds']:.1f}s"
+    return text
+
+def track_ocr_batch(files, kind, settings, make_task):
+    """Start (or find) background jobs for a set of uploads and return the session's batch.
+
+    Files are deduplicated by content hash; every batch becomes one conversation entry.
+    """
+    upload_keys = st.session_state["upload_keys"]
+    settings_key = cache_key(b"", settings)
+    doc_keys, uploads, duplicates = [], [], 0
+    for f in files:
+        upload = (f.file_id, settings_key)
+        if upload not in upload_keys:
+            upload_keys[upload] = cache_key(f.getvalue(), settings)
+        key = upload_keys[upload]
+        if key in doc_keys:
+            duplicates += 1
+            continue
+        doc_keys.append(key)
+        uploads.append(f)
+    key = jobs.batch_key(doc_keys)
+    for batch in st.session_state["ocr_batches"]:
+        if batch["key"] == key:
+            return batch
+    names = [f.name for f in uploads]
+    tasks = [make_task(f.getvalue()) for f in uploads]
+    manager = get_ocr_jobs()
+    batch = {
+        "key": key,
+        "kind": kind,
+        "job_ids": [manager.submit(k, kind, n, t).id for k, n, t in zip(doc_keys, names, tasks)],
+        "duplicates": duplicates,
+        "started_at": time.time(),
+    }
+    st.session_state["ocr_batches"].append(batch)
+    return batch
+
+def batch_jobs(batch):
+    return [j for j in (get_ocr_jobs().get(i) for i in batch["job_ids"]) if j is not None]
+
+def drop_ready_pages(doc_keys):
+    for key in doc_keys:
+        for part in st.session_state["partial_docs"].pop(key, {}).get("parts", []):
+            st.session_state["doc_index"].remove_document(part, release=True)
+
+def index_ready_pages(batch_list):
+    # Pages read so far are searchable (questions get excerpts from them) before the
+    # whole batch is finished and added to the conversation
+    index = st.session_state["doc_index"]
+    partial = st.session_state["partial_docs"]
+    for job in batch_list:
+        if job.doc_key in st.session_state["ingested_docs"]:
+            continue
+        state = partial.setdefault(job.doc_key, {"pages": 0, "parts": [], "complete": False})
+        if state["complete"]:
+            continue
+        # read once: the job drops its builder when it finishes
+        builder = job.builder
+        if builder is not None:
+            ready = builder.contiguous()[state["pages"]:]
+            state["pages"] += len(ready)
+            text = pdf_ingest.join_pages(ready)
+        elif job.status == "done":
+            # finished while the rest of its batch runs: its whole text replaces the pages
+            for part in state["parts"]:
+                index.remove_document(part, release=True)
+            state["parts"] = []
+            state["complete"] = True
+            text = job.text or ""
+        else:
+            continue
+        if text.strip():
+            part = f"{job.doc_key}:{len(state['parts'])}:{state['pages']}"
+            index.add_document(part, text)
+            state["parts"].append(part)
+
+def attach_finished_ocr_jobs():
+    for batch in st.session_state["ocr_batches"]:
+        if batch.get("attached"):
+            continue
+        finished_jobs = batch_jobs(batch)
+        if not all(j.finished for j in finished_jobs):
+            index_ready_pages(finished_jobs)
+            continue
+        batch["attached"] = True
+        # only files this session hasn't already added, whichever batch they came in
+        new_jobs = [
+            j for j in finished_jobs
+            if j.status == "done" and j.doc_key not in st.session_state["ingested_docs"]
+        ]
+        text = jobs.combine_texts(new_jobs) if new_jobs else ""
+        if text.strip():
+            # decide whether to auto-send to model or leave it for a manual send
+            if ingest_ocr_text([j.doc_key for j in new_jobs], text) and st.session_state.get("auto_send_ocr", True):
+                start_generation()
+        # files that failed or had no text leave nothing behind in the index
+        drop_ready_pages([j.doc_key for j in finished_jobs])
+    # keep only the most recent batches around for the upload tabs
+    st.session_state["ocr_batches"] = st.session_state["ocr_batches"][-20:]
+
+def render_message(index, msg):
+    if "preview" not in msg:
+        # computed once per message; large OCR dumps show their first lines until expanded
+        msg["preview"] = history_view.preview(message_text(msg))
+    head, hidden_lines = msg["preview"]
+    expanded = st.session_state["expanded_messages"]
+    if hidden_lines and index not in expanded:
+        st.markdown(head)
+        st.button(
+            f"Show full text ({hidden_lines} more lines)",
+            key=f"expand_message_{index}",
+            on_click=expanded.add,
+            args=(index,),
+        )
+    else:
+        st.markdown(message_text(msg))
+        if hidden_lines:
+            st.button("Collapse", key=f"collapse_message_{index}", on_click=expanded.discard, args=(index,))
+    if msg.get("stats"):
+        st.caption(format_stream_stats(msg["stats"]))
+
+def show_ocr_batch(batch, label, button_key):
+    batch_list = batch_jobs(batch)
+    if not all(j.finished for j in batch_list):
+        ocr_batch_status(batch["job_ids"])
+        return
+    for job in batch_list:
+        if job.status == "error":
+            st.error(f"{job.name}: extraction failed: {job.error}")
+    text = jobs.combine_texts(batch_list)
+    if not text.strip():
+        st.warning("No extractable text found.")
+        return
+    st.success(f"{label} successful!")
+    stats = jobs.batch_stats(batch_list, batch["started_at"])
+    if len(batch_list) > 1 or batch["duplicates"]:
+        skipped = f" · {batch['duplicates']} duplicate(s) skipped" if batch["duplicates"] else ""
+        st.caption(
+            f"{stats['files']} files · {stats['pages']} pages in {stats['seconds']:.1f}s · "
+            f"{stats['pages_per_sec']:.1f} pages/s · {stats['files_per_sec']:.2f} files/s{skipped}"
+        )
+    st.write(text)
+    for job in batch_list:
+        if job.timings:
+            with st.expander(f"⏱ Per-page timing — {job.name}"):
+                st.dataframe(job.timings, use_container_width=True)
+    # the result is added to the chat below; offer a manual send if auto-send is off
+    if not st.session_state.get("auto_send_ocr", True):
+        if st.button(f"Send {label} to model", key=button_key):
+            start_generation()
+
+def start_generation():
+    st.session_state["full_message"] = ""
+    st.session_state["is_generating"] = True
+    st.session_state["current_response"] = ""
 
 
 # ================== HEADER ==================
@@ -488,16 +629,10 @@ with col2:
     st.button(btn_label, on_click=toggle_theme, key="theme_toggle")
 
 # Header: show an image logo if available in workspace, otherwise use inline SVG
-logo_path = None
-if os.path.exists("assets/logo.png"):
-    logo_path = "assets/logo.png"
-elif os.path.exists("logo.png"):
-    logo_path = "logo.png"
-
-if logo_path:
+if logo_image:
     cols = st.columns([0.12, 0.88])
     with cols[0]:
-        st.image(logo_path, width=56)
+        st.image(logo_image, width=56)
     with cols[1]:
         st.markdown(
             """
@@ -552,87 +687,89 @@ with main_container:
 
         with tab_img:
             st.markdown('<div class="deb-card">', unsafe_allow_html=True)
-            st.write("Upload an image to extract text and add it to chat context.")
-            img = st.file_uploader("Upload image", type=["png", "jpg", "jpeg"])
-            if img:
-                image = Image.open(img)
-                st.image(image, use_container_width=True)
-                extracted = pytesseract.image_to_string(image).strip()
-                if extracted:
-                    st.success("Image OCR successful!")
-                    st.write(extracted)
-                    # append extracted text as user message
-                    st.session_state["messages"].append({"role": "user", "content": extracted})
-                    # save last OCR for manual hotkey send
-                    st.session_state["last_ocr"] = extracted
-                    # decide whether to auto-send to model or offer manual send
-                    if st.session_state.get("auto_send_ocr", True):
-                        st.session_state["full_message"] = ""
-                        st.session_state["is_generating"] = True
-                        st.session_state["current_response"] = ""
-                    else:
-                        if st.button("Send image OCR to model", key="send_img_ocr"):
-                            st.session_state["full_message"] = ""
-                            st.session_state["is_generating"] = True
-                            st.session_state["current_response"] = ""
+            st.write("Upload one or more images to extract text and add it to chat context.")
+            imgs = st.file_uploader("Upload images", type=["png", "jpg", "jpeg"], accept_multiple_files=True)
+            if imgs:
+                if len(imgs) == 1:
+                    st.image(preview_thumbnail(imgs[0].file_id, imgs[0].getvalue()), use_container_width=True)
+                else:
+                    st.image(
+                        [preview_thumbnail(f.file_id, f.getvalue(), 320) for f in imgs],
+                        width=160,
+                        caption=[f.name for f in imgs],
+                    )
+                batch = track_ocr_batch(
+                    imgs,
+                    "image",
+                    ocr_settings("image", preprocess=preprocess_options),
+                    lambda data: jobs.image_task(data, preprocess_options, get_preprocess_cache()),
+                )
+                show_ocr_batch(batch, "Image OCR", "send_img_ocr")
             st.markdown('</div>', unsafe_allow_html=True)
 
         with tab_pdf:
             st.markdown('<div class="deb-card">', unsafe_allow_html=True)
-            st.write("Upload a PDF and DebAI will read all pages.")
-            pdf = st.file_uploader("Upload PDF", type=["pdf"])
-            if pdf:
-                pdf_text = ""
-                with pdfplumber.open(pdf) as pdf_file:
-                    for page in pdf_file.pages:
-                        text = page.extract_text()
-                        if text:
-                            pdf_text += text + "\n"
-                        else:
-                            # If no text found, try OCR on the page image to capture embedded text
-                            try:
-                                page_image = page.to_image(resolution=300)
-                                pil_img = page_image.original
-                                ocr_text = pytesseract.image_to_string(pil_img).strip()
-                                if ocr_text:
-                                    pdf_text += ocr_text + "\n"
-                            except Exception:
-                                # fallback: ignore page if OCR fails
-                                pass
-                if pdf_text.strip():
-                    st.success("PDF text extraction successful!")
-                    st.write(pdf_text)
-                    # append extracted text as user message
-                    st.session_state["messages"].append({"role": "user", "content": pdf_text})
-                    # save last OCR for manual hotkey send
-                    st.session_state["last_ocr"] = pdf_text
-                    # decide whether to auto-send to model or offer manual send
-                    if st.session_state.get("auto_send_ocr", True):
-                        st.session_state["full_message"] = ""
-                        st.session_state["is_generating"] = True
-                        st.session_state["current_response"] = ""
-                    else:
-                        if st.button("Send PDF OCR to model", key="send_pdf_ocr"):
-                            st.session_state["full_message"] = ""
-                            st.session_state["is_generating"] = True
-                            st.session_state["current_response"] = ""
-                else:
-                    st.warning("No extractable text found in PDF.")
+            st.write("Upload one or more PDFs and DebAI will read all pages.")
+            pdfs = st.file_uploader("Upload PDFs", type=["pdf"], accept_multiple_files=True)
+            if pdfs:
+                workers = int(pdf_workers)
+                executor = get_pdf_executor(workers) if workers > 1 else None
+                batch = track_ocr_batch(
+                    pdfs,
+                    "pdf",
+                    ocr_settings(
+                        "pdf",
+                        resolution=PDF_OCR_RESOLUTION,
+                        adaptive=PDF_ADAPTIVE_RENDERING,
+                        preprocess=preprocess_options,
+                    ),
+                    lambda data: jobs.pdf_task(
+                        data,
+                        workers=workers,
+                        resolution=PDF_OCR_RESOLUTION,
+                        tesseract_cmd=tesseract_cmd(),
+                        executor=executor,
+                        preprocess_options=preprocess_options,
+                        adaptive=PDF_ADAPTIVE_RENDERING,
+                    ),
+                )
+                show_ocr_batch(batch, "PDF text extraction", "send_pdf_ocr")
             st.markdown('</div>', unsafe_allow_html=True)
 
+    # Add OCR results that finished since the last rerun to the conversation
+    attach_finished_ocr_jobs()
+
     # ---------- CHAT SECTION ----------
     st.markdown("<br><div class='deb-section-title'>💬 Chat with DebAI</div>", unsafe_allow_html=True)
 
     # placeholder for a small "Generating..." badge while model streams
     gen_badge = st.empty()
 
-    # Show all messages in serial order (user then assistant)
-    if len(st.session_state["messages"]) >= 1:
-        for msg in st.session_state["messages"]:
-            if msg["role"] == "system":
-                continue
-            with st.chat_message(msg["role"]):
-                st.markdown(msg["content"])
+    # Show the most recent messages in serial order (user then assistant); older ones
+    # are loaded a page at a time, so a rerun costs the same however long the chat is
+    messages = st.session_state["messages"]
+    history_start = history_view.visible_start(messages, st.session_state["history_pages"])
+    hidden_messages = history_view.hidden_count(messages, history_start)
+    if hidden_messages or st.session_state["history_pages"]:
+        load_col, recent_col = st.columns(2)
+        if hidden_messages:
+            load_col.button(
+                f"⬆ Load earlier messages ({hidden_messages} more)",
+                key="load_earlier_messages",
+                on_click=lambda: st.session_state.update(history_pages=st.session_state["history_pages"] + 1),
+            )
+        if st.session_state["history_pages"]:
+            recent_col.button(
+                "Show recent only",
+                key="show_recent_messages",
+                on_click=lambda: st.session_state.update(history_pages=0),
+            )
+    for index in range(history_start, len(messages)):
+        msg = messages[index]
+        if msg["role"] == "system":
+            continue
+        with st.chat_message(msg["role"]):
+            render_message(index, msg)
 
     # Hotkey link: clicking (or pressing Alt+S) will add ?send_last_ocr=1 to URL
     # Streamlit will detect and trigger sending the last OCR result.
@@ -660,16 +797,14 @@ with main_container:
     prompt = st.chat_input("Type your message here...")
     if prompt:
         # Append user message to history and display it immediately
-        st.session_state["messages"].append({"role": "user", "content": prompt})
+        add_message({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
-        st.session_state["full_message"] = ""
-        st.session_state["is_generating"] = True
-        st.session_state["current_response"] = ""
+        start_generation()
 
-    def generate():
+    def build_generation_payload():
             # Deterministic Language Detection based on Unicode ranges
-            last_user_msg = st.session_state["messages"][-1]["content"]
+            last_user_msg = message_text(st.session_state["messages"][-1])
             
             # Bengali Unicode Block: U+0980 to U+09FF
             has_bengali = any('\u0980' <= char <= '\u09FF' for char in last_user_msg)
@@ -699,98 +834,142 @@ with main_container:
                     "Respond in the detected language script only.]"
                 )
 
-            # Prefer Ollama when available (local usage)
-            if OLLAMA_AVAILABLE and ollama is not None:
-                # Create a copy of messages to avoid modifying the UI state
-                messages_payload = [m.copy() for m in st.session_state["messages"]]
-                if messages_payload and messages_payload[-1]["role"] == "user":
-                    messages_payload[-1]["content"] += lang_instruction
-
-                stream = ollama.chat(model=MODEL, stream=True, messages=messages_payload)
-                response = ""
-                for chunk in stream:
-                    text = chunk.get("message", {}).get("content", "")
-                    response += text
-                    # update session state so reruns can show progress if needed
-                    st.session_state["current_response"] = response
-                    yield response
-                return response
-
-            # Fallback to Gemini if available and configured
-            if GEMINI_AVAILABLE and genai is not None:
-                api_key = os.getenv("GEMINI_API_KEY")
-                if not api_key:
-                    msg = (
-                        "Assistant unavailable: Gemini API key not set (GEMINI_API_KEY).\n\n"
-                        "Set the environment variable to enable cloud-model fallback."
-                    )
-                    st.session_state["current_response"] = msg
-                    yield msg
-                    return msg
-
-                try:
-                    genai.configure(api_key=api_key)
-                    
-                    # Extract system instruction if present
-                    system_instruction = None
-                    gemini_history = []
-                    for m in st.session_state["messages"][:-1]: # Exclude last message which is the prompt
-                        if m["role"] == "system":
-                            system_instruction = m["content"]
-                            continue
-                        role = "user" if m["role"] == "user" else "model"
-                        gemini_history.append({"role": role, "parts": [m["content"]]})
-
-                    model = genai.GenerativeModel(GEMINI_MODEL, system_instruction=system_instruction)
-                    
-                    chat = model.start_chat(history=gemini_history)
-                    
-                    user_msg = st.session_state["messages"][-1]["content"] + lang_instruction
-                    response_stream = chat.send_message(user_msg, stream=True)
-                    
-                    response = ""
-                    for chunk in response_stream:
-                        text = chunk.text
-                        response += text
-                        st.session_state["current_response"] = response
-                        yield response
-                    return response
-                except Exception as e:
-                    msg = f"Gemini streaming failed: {e}"
-                    st.session_state["current_response"] = msg
-                    yield msg
-                    return msg
-
-            # If neither Ollama nor Gemini is available, show a helpful message
-            msg = (
-                "Assistant unavailable: no supported model client found (ollama or google-generativeai).\n\n"
-                "Use Ollama locally or set GEMINI_API_KEY for cloud-model fallback."
-            )
-            st.session_state["current_response"] = msg
-            yield msg
-            return msg
+            # Build a fresh payload to avoid modifying the UI state
+            messages_payload = build_messages_payload()
+            if messages_payload and messages_payload[-1]["role"] == "user":
+                messages_payload[-1]["content"] += lang_instruction
+            return messages_payload
+
+    def generate(messages_payload, meta, cancel):
+            # The router picks a healthy backend by policy and fails over if it errors
+            # or its first chunk is late; deltas are yielded for the caller to render
+            try:
+                yield from get_router().stream(
+                    messages_payload, st.session_state, policy=routing_policy, meta=meta, cancel=cancel
+                )
+                # a cancelled answer is partial: not cached, not recorded as a generation
+                if not meta.get("cancelled"):
+                    meta["completed"] = True
+            except NoBackendAvailable as e:
+                reasons = "\n".join(f"- `{name}`: {reason}" for name, reason in e.failures)
+                yield (
+                    "Assistant unavailable: no model backend could answer.\n\n"
+                    f"{reasons}\n\n"
+                    "Use Ollama locally or set GEMINI_API_KEY for cloud-model fallback."
+                )
+            except Exception as e:
+                yield f"\n\n_[Response interrupted: {e}]_"
 
     # If we just got a prompt, stream assistant response below the conversation
     if st.session_state["is_generating"]:
-        partial_response = ""
-        # show generating badge while streaming
-        gen_badge.markdown(
-            """
-            <div style="display: flex; align-items: center; gap: 12px; padding: 12px 20px; background: var(--card-bg); border-radius: 16px; border: 1px solid var(--border-color); width: fit-content; backdrop-filter: blur(var(--glass-blur)); box-shadow: var(--card-shadow);">
-                <div class="loader"></div>
-                <span style="font-weight: 600; color: var(--text-primary); font-size: 0.95rem;">Thinking...</span>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
+        run_kind = "generation"
+        badge = {"label": None, "shown_at": 0.0}
+
+        def show_badge(label):
+            badge["label"] = label
+            badge["shown_at"] = time.perf_counter()
+            gen_badge.markdown(
+                f"""
+                <div style="display: flex; align-items: center; gap: 12px; padding: 12px 20px; background: var(--card-bg); border-radius: 16px; border: 1px solid var(--border-color); width: fit-content; backdrop-filter: blur(var(--glass-blur)); box-shadow: var(--card-shadow);">
+                    <div class="loader"></div>
+                    <span style="font-weight: 600; color: var(--text-primary); font-size: 0.95rem;">{label}</span>
+                </div>
+                """,
+                unsafe_allow_html=True,
+            )
+
+        def heartbeat():
+            # Streamlit only stops a run at an st.* call; re-sending the badge lets Stop
+            # interrupt the wait for a model slot or for the first chunk
+            if badge["label"] is not None and time.perf_counter() - badge["shown_at"] >= 0.25:
+                show_badge(badge["label"])
+
+        # Clicking Stop (or any other widget, or closing the tab) interrupts this run;
+        # the token makes sure the model stream is closed and the partial answer kept
+        cancel_token = CancelToken(heartbeat=heartbeat)
+        renderer = None
+
+        def keep_partial_answer(reason):
+            cancel_token.cancel(reason)
+            partial = renderer.text if renderer is not None else ""
+            if partial.strip():
+                stats = renderer.stats()
+                stats["cancelled"] = True
+                add_message({"role": "assistant", "content": partial, "stats": stats})
+            st.session_state["is_generating"] = False
+
+        stop_slot = st.empty()
+        stop_slot.button("⏹ Stop generating", key="stop_generation", on_click=lambda: cancel_token.cancel("stopped"))
+
         with st.chat_message("assistant"):
             placeholder = st.empty()
-            # Pass the full messages (including latest user message) to the model
-            for partial_response in generate():
-                placeholder.markdown(partial_response)
-        # clear the badge after generation finishes
+
+            def render_partial(text):
+                # update session state so reruns can show progress if needed
+                st.session_state["current_response"] = text
+                placeholder.markdown(text)
+
+            with metrics.span("payload_build_seconds"):
+                payload = build_generation_payload()
+            response_cache = get_response_cache() if use_response_cache else None
+            cached = None
+            if response_cache is not None:
+                cached = response_cache.get([b.name for b in get_router().order(routing_policy)], payload)
+            # Re-render at most every 50 ms / 200 chars rather than on every token
+            renderer = StreamRenderer(render_partial, interval=0.05, max_chars=200)
+            stream_meta = {}
+            queue_seconds = 0.0
+            if cached is not None:
+                # replayed in one go; no model slot needed
+                stream_meta.update(backend=cached.backend, cache_hit=True, saved_seconds=cached.seconds)
+                final_response = renderer.consume([cached.text])
+            else:
+                # a cache hit later saves the whole wait: queue, first token and streaming
+                requested_at = time.perf_counter()
+                try:
+                    # Wait for one of the process-wide model slots; show our place in line meanwhile
+                    with get_scheduler().slot(
+                        st.session_state["session_id"],
+                        on_wait=lambda position: show_badge(f"Queued — position {position}"),
+                        cancel=cancel_token,
+                    ) as ticket:
+                        # show generating badge while streaming
+                        show_badge("Thinking...")
+                        final_response = renderer.consume(
+                            generate(payload, stream_meta, cancel_token), cancel=cancel_token
+                        )
+                except GenerationCancelled:
+                    # cancelled while queued or mid-stream: keep what arrived, like a Stop click
+                    keep_partial_answer(cancel_token.reason)
+                    st.rerun()
+                except BaseException:
+                    # the script run was interrupted (rerun or session closed) mid-stream
+                    keep_partial_answer("interrupted")
+                    raise
+                queue_seconds = ticket.wait_seconds
+                stream_meta["total_seconds"] = time.perf_counter() - requested_at
+            stream_stats = renderer.stats()
+            stream_stats.update(stream_meta)
+            stream_stats["queue_seconds"] = queue_seconds
+            if response_cache is not None and stream_meta.get("completed"):
+                response_cache.put(stream_meta["backend"], payload, final_response, stream_stats["total_seconds"])
+            if stream_meta.get("completed"):
+                backend = stream_meta["backend"]
+                metrics.observe("generation_queue_seconds", queue_seconds)
+                if stream_stats.get("first_chunk_seconds") is not None:
+                    metrics.observe("generation_first_chunk_seconds", stream_stats["first_chunk_seconds"], backend=backend)
+                metrics.observe("generation_stream_seconds", stream_stats["stream_seconds"], backend=backend)
+                metrics.observe("generation_tokens_per_second", stream_stats["tokens_per_sec"], backend=backend)
+            st.caption(format_stream_stats(stream_stats))
+        # clear the badge and the stop button after generation finishes
         gen_badge.empty()
+        stop_slot.empty()
         # generation finished; append final assistant message and clear flag
-        st.session_state["full_message"] = partial_response
-        st.session_state["messages"].append({"role": "assistant", "content": st.session_state["full_message"]})
+        add_message({"role": "assistant", "content": final_response, "stats": stream_stats})
+        # the answer is kept once, in the conversation (or the session store)
+        st.session_state["full_message"] = ""
+        st.session_state["current_response"] = ""
         st.session_state["is_generating"] = False
+
+# Generation runs last as long as the model takes, so they are labelled apart
+metrics.observe("script_run_seconds", time.perf_counter() - SCRIPT_STARTED, run=run_kind)
@@ -0,0 +1,207 @@
+"""Model backend clients shared across Streamlit sessions.
+
+``ClientRegistry`` is meant to be created once per process (``st.cache_resource``)
+so the Ollama HTTP client keeps its connection pool alive between turns and
+Gemini is configured once per API key. ``GeminiChatHandle`` lives in each
+session and keeps the Gemini chat object between turns, so a new turn only adds
+the new message instead of rebuilding the chat from the full history.
+``ModelWarmer`` preloads the Ollama model in the background and keeps it loaded.
+
+The client libraries are only imported when the first client is created (on
+the warm-up thread for Ollama); together they take about a second to import.
+"""
+import hashlib
+import importlib.util
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def _installed(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+
+# Ollama may not be available in hosted environments (Streamlit Cloud)
+OLLAMA_AVAILABLE = _installed("ollama")
+GEMINI_AVAILABLE = _installed("google.generativeai")
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST")  # None -> the client's default (localhost:11434)
+
+
+def parse_keep_alive(value):
+    # Ollama takes either a duration string ("30m") or a number of seconds (-1 = forever)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+# How long Ollama keeps the model in memory after the last request
+OLLAMA_KEEP_ALIVE = parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+# Seconds a health check (``ollama ps``) may take before the server counts as unreachable
+OLLAMA_PROBE_TIMEOUT = float(os.getenv("DEBAI_OLLAMA_PROBE_TIMEOUT", "2"))
+
+
+class ClientRegistry:
+    def __init__(self, ollama_host=OLLAMA_HOST, max_gemini_models=16, probe_timeout=OLLAMA_PROBE_TIMEOUT):
+        self.ollama_host = ollama_host
+        self.max_gemini_models = max_gemini_models
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._ollama = None
+        self._ollama_probe = None
+        self._gemini_key = None
+        self._gemini_models = OrderedDict()
+
+    def ollama(self):
+        # one httpx-backed client per process: connections are pooled and kept alive
+        with self._lock:
+            if self._ollama is None:
+                import ollama
+                self._ollama = ollama.Client(host=self.ollama_host)
+            return self._ollama
+
+    def ollama_probe(self):
+        # health checks run on the script thread, so they get a client of their own with
+        # a short timeout; the main one has none, as a model load can take minutes
+        with self._lock:
+            if self._ollama_probe is None:
+                import ollama
+                self._ollama_probe = ollama.Client(host=self.ollama_host, timeout=self.probe_timeout)
+            return self._ollama_probe
+
+    def gemini_model(self, api_key, model_name, system_instruction=None):
+        import google.generativeai as genai
+        with self._lock:
+            if api_key != self._gemini_key:
+                genai.configure(api_key=api_key)
+                self._gemini_key = api_key
+                self._gemini_models.clear()
+            key = (model_name, system_instruction)
+            model = self._gemini_models.get(key)
+            if model is None:
+                model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+                self._gemini_models[key] = model
+                while len(self._gemini_models) > self.max_gemini_models:
+                    self._gemini_models.popitem(last=False)
+            else:
+                self._gemini_models.move_to_end(key)
+            return model
+
+
+def history_digest(history):
+    """Hash of a Gemini ``history`` (roles and texts), to tell whether a chat holds it."""
+    h = hashlib.sha256()
+    for turn in history:
+        h.update(turn["role"].encode("utf-8") + b"\0")
+        for part in turn["parts"]:
+            h.update(part.encode("utf-8") + b"\0")
+        h.update(b"\1")
+    return h.hexdigest()
+
+
+class GeminiChatHandle:
+    """Per-session Gemini chat, reused while it is in step with the payload history."""
+
+    def __init__(self):
+        self.chat = None
+        self.key = None
+        self.digest = None  # history_digest of what the chat holds after its last turn
+
+    def stream(self, model, model_name, system_instruction, history, message):
+        key = (model_name, system_instruction)
+        # The chat can only be reused if it already holds exactly the history we would
+        # send (an edited or dropped turn changes it even when the length doesn't); a
+        # moved context window changes the system instruction (its summary)
+        if self.chat is None or key != self.key or history_digest(history) != self.digest:
+            self.chat = model.start_chat(history=history)
+            self.key = key
+        reply = []
+        try:
+            for chunk in self.chat.send_message(message, stream=True):
+                reply.append(chunk.text)
+                yield chunk.text
+        except BaseException:
+            # a half-finished turn leaves the chat out of step; start over next time
+            self.chat = None
+            raise
+        self.digest = history_digest(
+            history + [{"role": "user", "parts": [message]}, {"role": "model", "parts": ["".join(reply)]}]
+        )
+
+
+class ModelWarmer:
+    """Loads an Ollama model in a background thread and tracks whether it is resident.
+
+    ``state`` is one of "cold", "loading", "ready" or "error". ``status()`` returns
+    it straight away; at most every ``status_ttl`` seconds it also has a background
+    thread check ``ollama ps``, which loads the model again if the server unloaded it.
+    """
+
+    def __init__(self, registry, model, keep_alive=OLLAMA_KEEP_ALIVE, status_ttl=5.0):
+        self.registry = registry
+        self.model = model
+        self.keep_alive = keep_alive
+        self.status_ttl = status_ttl
+        self.state = "cold"
+        self.error = None
+        self.load_seconds = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.state = "loading"
+            self._thread = threading.Thread(target=self._warm, name="debai-model-warmup", daemon=True)
+            self._thread.start()
+
+    def _warm(self):
+        start = time.perf_counter()
+        try:
+            # An empty prompt makes Ollama load the model without generating anything
+            response = self.registry.ollama().generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+            load_ns = response.get("load_duration") or 0
+            self.load_seconds = load_ns / 1e9 if load_ns else time.perf_counter() - start
+            self.error = None
+            self.state = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.state = "error"
+        self._checked_at = time.monotonic()
+
+    def is_loaded(self):
+        response = self.registry.ollama_probe().ps()
+        for m in response.get("models") or []:
+            if self.model in (m.get("model"), m.get("name")):
+                return True
+        return False
+
+    def _refresh(self):
+        try:
+            loaded = self.is_loaded()
+        except Exception as e:
+            self.error = str(e)
+            self.state = "error"
+            return
+        if loaded:
+            self.state = "ready"
+        else:
+            # unloaded by the server (keep-alive expired, evicted); load it again
+            self.state = "loading"
+            self._warm()
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at >= self.status_ttl and not (self._thread and self._thread.is_alive()):
+                self._checked_at = now
+                self._thread = threading.Thread(target=self._refresh, name="debai-model-status", daemon=True)
+                self._thread.start()
+        return self.state
@@ -0,0 +1,363 @@
+"""Bulk OCR without Streamlit.
+
+Usable as a library (``find_documents``, ``extract_document``, ``iter_extract``)
+or from the command line::
+
+    python batch_ocr.py scans/ "archive/**/*.pdf" -o results.jsonl --workers 8
+
+Each document becomes one JSON line (path, cache key, page timings, text).
+PDF pages and images are OCR'd in parallel on a process pool, and results are
+written in input order as soon as they are ready. With an output file, finished
+documents are recorded in ``<output>.done`` and skipped on the next run, so an
+interrupted job picks up where it stopped. Results go through the same OCR cache
+as the app, so documents processed here open instantly in the chat.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import pdf_ingest
+import preprocess
+from ocr import CACHE_PATH, OCRCache, cache_key, image_to_text, ocr_settings
+from ocr_engines import set_tesseract_cmd, tesseract_cmd as current_tesseract_cmd
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+PDF_EXTENSIONS = (".pdf",)
+
+
+def document_kind(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PDF_EXTENSIONS:
+        return "pdf"
+    if ext in IMAGE_EXTENSIONS:
+        return "image"
+    return None
+
+
+def find_documents(inputs):
+    """Expand files, directories (recursively) and glob patterns into document paths.
+
+    Files named explicitly are kept even if they don't exist, so the run reports
+    them as failed instead of skipping them without a word.
+    """
+    paths = []
+    missing = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                paths.extend(os.path.join(root, name) for name in sorted(files))
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item, recursive=True)))
+        else:
+            if not os.path.exists(item):
+                missing.add(item)
+            paths.append(item)
+    seen = set()
+    found = []
+    for path in paths:
+        if (path in missing or document_kind(path) and os.path.isfile(path)) and path not in seen:
+            seen.add(path)
+            found.append(path)
+    return found
+
+
+def _image_file_task(path, tesseract_cmd, preprocess_options):
+    # Runs inside a worker process
+    if tesseract_cmd:
+        set_tesseract_cmd(tesseract_cmd)
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        text = image_to_text(f.read(), preprocess_options)
+    return text, time.perf_counter() - start
+
+
+def _record(path, key, kind, start, text=None, pages=None, cached=False, error=None):
+    record = {
+        "path": path,
+        "key": key,
+        "kind": kind,
+        "seconds": round(time.perf_counter() - start, 3),
+        "cached": cached,
+    }
+    if pages is not None:
+        record["pages"] = pages
+    if error is not None:
+        record["error"] = error
+    if text is not None:
+        record["chars"] = len(text)
+        record["text"] = text
+    return record
+
+
+def _page_timings(results):
+    pages = []
+    for r in results:
+        page = {"page": r.index + 1, "method": r.method, "seconds": round(r.seconds, 3), "chars": len(r.text)}
+        if r.error:
+            page["error"] = r.error
+        pages.append(page)
+    return pages
+
+
+def _page_errors(results):
+    """The ``error`` of a PDF record whose pages didn't all OCR, or None."""
+    failed = [r for r in results if r.method == "error"]
+    if not failed:
+        return None
+    return f"{len(failed)} of {len(results)} pages failed: " + "; ".join(
+        f"page {r.index + 1}: {r.error}" for r in failed
+    )
+
+
+def extract_document(path, executor=None, workers=None, resolution=pdf_ingest.DEFAULT_RESOLUTION,
+                     tesseract_cmd=None, cache=None, preprocess_options=None, adaptive=True):
+    """OCR one file and return its JSONL record.
+
+    ``error`` is set if the file or any of its pages failed; a PDF with failed
+    pages still carries the text of the others.
+    """
+    start = time.perf_counter()
+    kind = document_kind(path)
+    tesseract_cmd = tesseract_cmd or current_tesseract_cmd()
+    key = None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        settings = _settings(kind, tesseract_cmd, resolution, preprocess_options, adaptive)
+        key = cache_key(data, settings)
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            return _record(path, key, kind, start, cached, cached=True)
+        if kind == "pdf":
+            results = pdf_ingest.extract_pdf_pages(
+                data, workers=workers, resolution=resolution, tesseract_cmd=tesseract_cmd, executor=executor,
+                preprocess_options=preprocess_options, adaptive=adaptive,
+            )
+            text = pdf_ingest.join_pages(results)
+            pages = _page_timings(results)
+            page_errors = _page_errors(results)
+        else:
+            text = image_to_text(data, preprocess_options)
+            pages, page_errors = None, None
+    except Exception as e:
+        return _record(path, key, kind, start, error=str(e))
+    # a failed page would otherwise stay missing from the cached text for good
+    if cache is not None and page_errors is None:
+        cache.put(key, text)
+    return _record(path, key, kind, start, text, pages=pages, error=page_errors)
+
+
+def _settings(kind, tesseract_cmd, resolution, preprocess_options, adaptive=True):
+    if kind == "pdf":
+        return ocr_settings(
+            "pdf", tesseract_cmd, resolution=resolution, adaptive=adaptive, preprocess=preprocess_options
+        )
+    return ocr_settings("image", tesseract_cmd, preprocess=preprocess_options)
+
+
+class _Document:
+    """A document being OCR'd by ``iter_extract``; finished ones are yielded in input order."""
+
+    def __init__(self, path, start):
+        self.path = path
+        self.kind = document_kind(path)
+        self.start = start
+        self.key = None
+        self.todo = deque()  # page indices (None for an image) not submitted yet
+        self.futures = []
+        self.record = None  # set up front for cache hits and unreadable files
+
+    @property
+    def done(self):
+        return self.record is not None or (not self.todo and all(f.done() for f in self.futures))
+
+
+def iter_extract(paths, workers=None, resolution=pdf_ingest.DEFAULT_RESOLUTION, tesseract_cmd=None,
+                 cache=None, skip=(), preprocess_options=None, adaptive=True):
+    """Yield a record per document in ``paths`` order, skipping paths in ``skip``.
+
+    Images and PDF pages of consecutive documents share one pool: up to
+    ``2 * workers`` tasks are in flight at once, so a folder of short scanned
+    PDFs keeps every worker busy rather than waiting for each document in turn.
+    """
+    workers = workers or pdf_ingest.DEFAULT_WORKERS
+    tesseract_cmd = tesseract_cmd or current_tesseract_cmd()
+    if workers <= 1:
+        for path in paths:
+            if path not in skip:
+                yield extract_document(
+                    path, None, 1, resolution, tesseract_cmd, cache, preprocess_options, adaptive
+                )
+        return
+
+    max_in_flight = workers * 2
+    executor = pdf_ingest.make_executor(workers)
+    pending = deque()  # documents in input order
+
+    def open_document(path):
+        doc = _Document(path, time.perf_counter())
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            doc.key = cache_key(data, _settings(doc.kind, tesseract_cmd, resolution, preprocess_options, adaptive))
+            cached = cache.get(doc.key) if cache is not None else None
+            if cached is not None:
+                doc.record = _record(path, doc.key, doc.kind, doc.start, cached, cached=True)
+            elif doc.kind == "pdf":
+                doc.todo.extend(range(pdf_ingest.page_count(data)))
+            else:
+                doc.todo.append(None)
+        except Exception as e:
+            doc.record = _record(path, doc.key, doc.kind, doc.start, error=str(e))
+        return doc
+
+    def in_flight():
+        return [f for doc in pending for f in doc.futures if not f.done()]
+
+    def can_read_ahead():
+        # only while the pool has room and the backlog of finished documents is short
+        return (
+            len(pending) <= max_in_flight
+            and not any(doc.todo for doc in pending)
+            and len(in_flight()) < max_in_flight
+        )
+
+    def submit():
+        # top up the pool in input order: later documents start while earlier ones finish
+        free = max_in_flight - len(in_flight())
+        for doc in pending:
+            while doc.todo and free > 0:
+                index = doc.todo.popleft()
+                if index is None:
+                    future = executor.submit(_image_file_task, doc.path, tesseract_cmd, preprocess_options)
+                else:
+                    future = pdf_ingest.submit_page(
+                        executor, doc.path, index, resolution, tesseract_cmd, preprocess_options, adaptive
+                    )
+                doc.futures.append(future)
+                free -= 1
+            if free <= 0:
+                return
+
+    def finish(doc):
+        if doc.record is not None:
+            return doc.record
+        try:
+            if doc.kind == "pdf":
+                results = sorted((f.result() for f in doc.futures), key=lambda r: r.index)
+                text, pages = pdf_ingest.join_pages(results), _page_timings(results)
+                page_errors = _page_errors(results)
+            else:
+                text, _ = doc.futures[0].result()
+                pages, page_errors = None, None
+        except Exception as e:
+            return _record(doc.path, doc.key, doc.kind, doc.start, error=str(e))
+        if cache is not None and page_errors is None:
+            cache.put(doc.key, text)
+        return _record(doc.path, doc.key, doc.kind, doc.start, text, pages=pages, error=page_errors)
+
+    try:
+        remaining = (path for path in paths if path not in skip)
+        exhausted = False
+        while True:
+            while not exhausted and can_read_ahead():
+                path = next(remaining, None)
+                if path is None:
+                    exhausted = True
+                    break
+                pending.append(open_document(path))
+                submit()
+            while pending and pending[0].done:
+                yield finish(pending.popleft())
+            if not pending:
+                if exhausted:
+                    return
+                continue
+            running = in_flight()
+            if running:
+                wait(running, return_when=FIRST_COMPLETED)
+            submit()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def read_checkpoint(path):
+    """Paths already finished in an earlier run."""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.rstrip("\n").split("\t", 1)[-1] for line in f if line.strip()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR images and PDFs in bulk and write JSONL.")
+    parser.add_argument("inputs", nargs="+", help="files, directories or glob patterns")
+    parser.add_argument("-o", "--output", help="JSONL file to append to (default: stdout)")
+    parser.add_argument("--checkpoint", help="file listing finished documents (default: <output>.done)")
+    parser.add_argument("--workers", type=int, default=pdf_ingest.DEFAULT_WORKERS, help="OCR processes")
+    parser.add_argument("--resolution", type=int, default=pdf_ingest.DEFAULT_RESOLUTION,
+                        help="maximum DPI for rasterizing PDF pages without a text layer")
+    parser.add_argument("--fixed-dpi", action="store_true",
+                        help="render every scanned page at --resolution and never OCR images on text pages")
+    parser.add_argument("--tesseract-cmd", help="path to the tesseract binary")
+    parser.add_argument("--no-preprocess", action="store_true",
+                        help="OCR images as they are (no scaling, grayscale or binarization)")
+    parser.add_argument("--deskew", action="store_true", help="straighten skewed scans before OCR")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the OCR cache")
+    args = parser.parse_args(argv)
+    if args.tesseract_cmd:
+        # inline OCR (--workers 1) runs in this process; pool workers get it per task
+        set_tesseract_cmd(args.tesseract_cmd)
+
+    checkpoint = args.checkpoint or (args.output + ".done" if args.output else None)
+    done = read_checkpoint(checkpoint)
+    paths = find_documents(args.inputs)
+    cache = None if args.no_cache else OCRCache(CACHE_PATH)
+    preprocess_options = None if args.no_preprocess else preprocess.options(deskew=args.deskew)
+
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    ckpt = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+    start = time.perf_counter()
+    count = pages = failed = 0
+    try:
+        records = iter_extract(
+            paths, args.workers, args.resolution, args.tesseract_cmd, cache, done, preprocess_options,
+            not args.fixed_dpi,
+        )
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            count += 1
+            pages += len(record.get("pages") or [None])
+            if "error" in record:
+                failed += 1
+                print(f"error: {record['path']}: {record['error']}", file=sys.stderr)
+            elif ckpt is not None:
+                # only after the record is written, so a crash re-does the document rather than losing it
+                ckpt.write(f"{record['key']}\t{record['path']}\n")
+                ckpt.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if ckpt is not None:
+            ckpt.close()
+        if cache is not None:
+            cache.prune()
+    seconds = time.perf_counter() - start
+    skipped = sum(1 for p in paths if p in done)
+    print(
+        f"{count} documents, {pages} pages in {seconds:.1f}s "
+        f"({pages / seconds if seconds > 0 else 0:.2f} pages/s), {failed} failed, {skipped} skipped",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
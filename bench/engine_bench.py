@@ -0,0 +1,106 @@
+"""Per-page overhead of each OCR engine.
+
+    python bench/engine_bench.py --pages 20 --json engines.json
+
+For every engine that can start, measures the first call (process start or
+model load), the median time for a tiny blank image (pure per-call overhead) and
+the median time for short synthetic pages, which is where that overhead
+dominates.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+
+import ocr_engines
+
+
+def short_page(i, font_size=28):
+    # a receipt-sized snippet: two lines of text
+    image = Image.new("L", (900, 140), 255)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=font_size)
+    except TypeError:
+        font = ImageFont.load_default()
+    draw.text((20, 20), f"Order {1000 + i} shipped to warehouse {i % 7}", fill=0, font=font)
+    draw.text((20, 75), f"Total {i * 3.25:.2f} EUR, paid by card", fill=0, font=font)
+    return image
+
+
+def measure(engine, pages, repeat):
+    start = time.perf_counter()
+    engine.image_to_text(pages[0])
+    first = time.perf_counter() - start
+
+    blank = Image.new("L", (32, 32), 255)
+    overhead = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine.image_to_text(blank)
+        overhead.append(time.perf_counter() - start)
+
+    per_page = []
+    chars = 0
+    for page in pages:
+        start = time.perf_counter()
+        chars += len(engine.image_to_text(page))
+        per_page.append(time.perf_counter() - start)
+    return {
+        "engine": engine.name,
+        "first_call_ms": round(first * 1000, 1),
+        "blank_call_ms": round(statistics.median(overhead) * 1000, 1),
+        "page_ms_p50": round(statistics.median(per_page) * 1000, 1),
+        "page_ms_max": round(max(per_page) * 1000, 1),
+        "pages_per_sec": round(len(pages) / sum(per_page), 2) if sum(per_page) else None,
+        "chars": chars,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20, help="short synthetic pages per engine")
+    parser.add_argument("--repeat", type=int, default=10, help="blank-image calls per engine")
+    parser.add_argument("--tesseract-cmd", help="path to the tesseract binary (pytesseract engine)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    if args.tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = args.tesseract_cmd
+    pages = [short_page(i) for i in range(args.pages)]
+    rows = []
+    for name in ("pytesseract", "tesserocr"):
+        engine = ocr_engines.make_engine(name, pool_size=1)
+        if engine.name != name:
+            rows.append({"engine": name, "skipped": engine.fallback_reason})
+            continue
+        try:
+            rows.append(measure(engine, pages, args.repeat))
+        except Exception as e:
+            rows.append({"engine": name, "skipped": str(e)})
+        finally:
+            engine.close()
+
+    print(f"{'engine':<12} {'first ms':>9} {'blank ms':>9} {'page p50':>9} {'page max':>9} {'pages/s':>8}")
+    for r in rows:
+        if "skipped" in r:
+            print(f"{r['engine']:<12} skipped: {r['skipped']}")
+            continue
+        print(
+            f"{r['engine']:<12} {r['first_call_ms']:>9.1f} {r['blank_call_ms']:>9.1f} "
+            f"{r['page_ms_p50']:>9.1f} {r['page_ms_max']:>9.1f} {r['pages_per_sec'] or 0:>8.2f}"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"pages": args.pages, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
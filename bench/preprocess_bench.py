@@ -0,0 +1,148 @@
+"""Compare Tesseract time and output with and without image preprocessing.
+
+    python bench/preprocess_bench.py                     # synthetic sample set
+    python bench/preprocess_bench.py scans/ --repeat 3 --json prep.json
+
+For every image the raw upload and the ``preprocess.prepare`` output are OCR'd;
+the table shows median OCR time, image size, characters recognised and how
+similar the two texts are.
+"""
+import argparse
+import difflib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytesseract
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+import preprocess
+from batch_ocr import document_kind, find_documents
+
+SAMPLE_TEXT = (
+    "Invoice 2024-117 issued to Acme Traders. Total due 4,820.50 within 30 days. "
+    "The quick brown fox jumps over the lazy dog."
+)
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has a single bitmap font
+        return ImageFont.load_default()
+
+
+def synthetic_page(size, font_size, background=(255, 255, 255), skew=0.0, blur=0.0, dpi=None):
+    image = Image.new("RGB", size, background)
+    draw = ImageDraw.Draw(image)
+    font = _font(font_size)
+    y = font_size * 2
+    line = 0
+    while y < size[1] - font_size * 2:
+        draw.text((font_size * 2, y), f"{line:03d} {SAMPLE_TEXT}", fill=(25, 25, 25), font=font)
+        y += int(font_size * 1.6)
+        line += 1
+    if skew:
+        image = image.rotate(skew, resample=Image.BICUBIC, fillcolor=background)
+    if blur:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    buf = io.BytesIO()
+    if dpi:
+        image.save(buf, format="PNG", dpi=(dpi, dpi))
+    else:
+        image.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def sample_set():
+    return [
+        ("phone photo 12MP", synthetic_page((4032, 3024), 64, background=(228, 222, 205), blur=1.2)),
+        ("phone photo, skewed", synthetic_page((4032, 3024), 64, background=(228, 222, 205), skew=2.5)),
+        ("A4 scan 600 dpi", synthetic_page((4960, 7016), 90, dpi=600)),
+        ("A4 scan 300 dpi", synthetic_page((2480, 3508), 45, dpi=300)),
+        ("screenshot", synthetic_page((1280, 800), 18)),
+    ]
+
+
+def _timed_ocr(image, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = pytesseract.image_to_string(image).strip()
+        times.append(time.perf_counter() - start)
+    return text, statistics.median(times)
+
+
+def run(samples, opts, repeat=1):
+    rows = []
+    for name, data in samples:
+        original = Image.open(io.BytesIO(data))
+        original.load()
+        raw_text, raw_seconds = _timed_ocr(original, repeat)
+
+        start = time.perf_counter()
+        prepared = preprocess.prepare(original, opts)
+        prep_seconds = time.perf_counter() - start
+        text, ocr_seconds = _timed_ocr(prepared, repeat)
+        rows.append({
+            "image": name,
+            "raw_size": list(original.size),
+            "prepared_size": list(prepared.size),
+            "raw_ocr_seconds": round(raw_seconds, 3),
+            "preprocess_seconds": round(prep_seconds, 3),
+            "prepared_ocr_seconds": round(ocr_seconds, 3),
+            "speedup": round(raw_seconds / (prep_seconds + ocr_seconds), 2) if prep_seconds + ocr_seconds else None,
+            "raw_chars": len(raw_text),
+            "prepared_chars": len(text),
+            "similarity": round(difflib.SequenceMatcher(None, raw_text, text).ratio(), 3),
+        })
+    return rows
+
+
+def print_table(rows):
+    header = f"{'image':<24} {'size':>11} {'-> size':>11} {'raw s':>7} {'prep s':>7} {'ocr s':>7} {'speedup':>7} {'chars':>13} {'similar':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['image'][:24]:<24} {'x'.join(map(str, r['raw_size'])):>11} "
+            f"{'x'.join(map(str, r['prepared_size'])):>11} {r['raw_ocr_seconds']:>7.2f} "
+            f"{r['preprocess_seconds']:>7.2f} {r['prepared_ocr_seconds']:>7.2f} {r['speedup'] or 0:>6.2f}x "
+            f"{r['raw_chars']:>6}/{r['prepared_chars']:<6} {r['similarity']:>7.3f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="*", help="images, directories or globs (default: synthetic samples)")
+    parser.add_argument("--repeat", type=int, default=1, help="OCR runs per image; the median is reported")
+    parser.add_argument("--deskew", action="store_true")
+    parser.add_argument("--tesseract-cmd", help="path to the tesseract binary")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    if args.tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = args.tesseract_cmd
+    if args.inputs:
+        samples = []
+        for path in find_documents(args.inputs):
+            if document_kind(path) == "image":
+                with open(path, "rb") as f:
+                    samples.append((os.path.basename(path), f.read()))
+    else:
+        samples = sample_set()
+    opts = preprocess.options(deskew=args.deskew)
+    rows = run(samples, opts, args.repeat)
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"options": opts, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Local stand-in for the Ollama HTTP API with a configurable token rate.
+
+    python bench/stub_ollama.py --port 11435 --rate 40 --tokens 300
+    OLLAMA_HOST=http://127.0.0.1:11435 streamlit run AI.py
+
+Implements the calls the app makes: ``/api/chat`` (streamed as NDJSON or in one
+piece), ``/api/generate`` (model preload), ``/api/ps`` and ``/api/tags``. Replies
+are a fixed word sequence, so runs are repeatable; ``first_token_delay`` stands
+in for prompt evaluation and ``load_delay`` for a cold model load (first request
+only). ``start()`` runs it in a background thread for the benchmark suite.
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "the invoice lists three items shipped from the main warehouse and the total "
+    "includes tax at the standard rate payment is due within thirty days of delivery"
+).split()
+
+
+class StubConfig:
+    def __init__(self, rate=50.0, tokens=200, first_token_delay=0.05, load_delay=0.0):
+        self.rate = rate  # tokens per second; 0 = as fast as possible
+        self.tokens = tokens
+        self.first_token_delay = first_token_delay
+        self.load_delay = load_delay
+        self.loaded = load_delay <= 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def reply_tokens(self):
+        return [("" if i == 0 else " ") + WORDS[i % len(WORDS)] for i in range(self.tokens)]
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # keep-alive, like the real server; streamed replies use chunked encoding
+    protocol_version = "HTTP/1.1"
+    config = None  # set on the subclass made by make_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _write_chunk(self, body):
+        data = json.dumps(body).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _load(self):
+        # a cold model is loaded by the first request that needs it
+        config = self.config
+        with config.lock:
+            config.requests += 1
+            if config.loaded:
+                return 0.0
+            time.sleep(config.load_delay)
+            config.loaded = True
+            return config.load_delay
+
+    def do_GET(self):
+        model = {"name": "stub", "model": "stub", "size": 0}
+        if self.path in ("/api/ps", "/api/tags"):
+            self._send_json({"models": [model] if self.path == "/api/tags" or self.config.loaded else []})
+        elif self.path == "/":
+            self._send_json({"status": "Ollama is running"})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        request = self._read_json()
+        model = request.get("model", "stub")
+        if self.path == "/api/generate":
+            load = self._load()
+            self._send_json({"model": model, "created_at": _now(), "response": "", "done": True,
+                             "load_duration": int(load * 1e9)})
+        elif self.path == "/api/chat":
+            self._chat(request, model)
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _chat(self, request, model):
+        config = self.config
+        started = time.perf_counter()
+        load = self._load()
+        time.sleep(config.first_token_delay)
+        tokens = config.reply_tokens()
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in request.get("messages", []))
+        if not request.get("stream", True):
+            time.sleep(len(tokens) / config.rate if config.rate else 0)
+            self._send_json({
+                "model": model, "created_at": _now(), "done": True, "done_reason": "stop",
+                "message": {"role": "assistant", "content": "".join(tokens)},
+            })
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        first = time.perf_counter()
+        try:
+            for i, token in enumerate(tokens):
+                if config.rate:
+                    # paced against the start so sleep overshoot doesn't accumulate
+                    delay = first + i / config.rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                self._write_chunk({"model": model, "created_at": _now(),
+                                   "message": {"role": "assistant", "content": token}, "done": False})
+            finished = time.perf_counter()
+            self._write_chunk({
+                "model": model, "created_at": _now(),
+                "message": {"role": "assistant", "content": ""},
+                "done": True, "done_reason": "stop",
+                "total_duration": int((finished - started) * 1e9),
+                "load_duration": int(load * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(config.first_token_delay * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int((finished - first) * 1e9),
+            })
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # the client closed the stream (Stop button); so does the real server
+            self.close_connection = True
+
+
+def make_server(config, host="127.0.0.1", port=0):
+    handler = type("BoundStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start(config=None, host="127.0.0.1", port=0):
+    """Serve in a background thread; returns ``(server, base_url)``."""
+    server = make_server(config or StubConfig(), host, port)
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--rate", type=float, default=50.0, help="tokens per second (0 = unthrottled)")
+    parser.add_argument("--tokens", type=int, default=200, help="tokens per reply")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="cold model load on the first request")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(args.rate, args.tokens, args.first_token_delay, args.load_delay)
+    server = make_server(config, args.host, args.port)
+    print(f"stub Ollama on http://{args.host}:{server.server_address[1]} "
+          f"({args.rate:g} tokens/s, {args.tokens} tokens per reply)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
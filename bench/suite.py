@@ -0,0 +1,470 @@
+"""Benchmark suite for the hot paths, with machine-readable results.
+
+    python bench/suite.py --json results.json
+    python bench/suite.py --quick --only ocr_png stream
+    python bench/suite.py --json new.json --compare results.json
+
+Scenarios (inputs are synthetic and generated the same way on every run):
+
+- ``ocr_png`` / ``ocr_jpeg``: ``ocr.image_to_text`` on an A4 300 DPI PNG scan and
+  a 12 MP phone-photo JPEG;
+- ``pdf_text`` / ``pdf_scanned``: ``pdf_ingest.extract_pdf_pages`` on a
+  multi-page PDF with a text layer and on one made of page images;
+- ``report``: ``report.create_pdf`` on a long chat history with OCR dumps;
+- ``stream``: the ``generate()`` path (``Router`` -> ``OllamaBackend`` ->
+  ``StreamRenderer``) against ``stub_ollama`` at a fixed token rate;
+- ``app_start`` / ``app_rerun``: one run of ``AI.py`` (Streamlit's ``AppTest``)
+  in a fresh interpreter, i.e. with the app's imports, and a rerun of an open
+  session. Both use the app's own ``script_run_seconds`` timing and are checked
+  against ``BUDGETS_MS`` (``--check-budgets`` fails the run when one is over).
+
+Each scenario runs in its own process, so peak memory isn't inflated by the
+ones before it: ``peak_rss_mb`` is sampled while the timed runs go, and
+``peak_child_rss_mb`` is the largest child process (tesseract, PDF workers; on
+Linux a freshly forked child starts out counted at its parent's size). Results hold p50/p95 latency, throughput and peak memory per
+scenario with the commit they were measured on; ``--compare`` prints the change
+against an earlier results file.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("ocr_png", "ocr_jpeg", "pdf_text", "pdf_scanned", "report", "stream", "app_start", "app_rerun")
+
+# p95 limits for the interactive paths; the first run of a new process includes
+# importing the app's modules, a rerun is what every click costs
+BUDGETS_MS = {"app_start": 500, "app_rerun": 50}
+
+SIZES = {
+    "quick": {"pages": 3, "scan_pages": 2, "messages": 40, "tokens": 100, "rate": 400.0},
+    "full": {"pages": 20, "scan_pages": 6, "messages": 200, "tokens": 300, "rate": 100.0},
+}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class PeakMemory:
+    """Peak resident memory of this process while the block runs, sampled every few ms.
+
+    Falls back to the lifetime peak (``ru_maxrss``) where ``/proc`` isn't available.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _rss(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss() or 0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if self._rss() is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        elif resource is not None:
+            self.peak = _maxrss(resource.RUSAGE_SELF)
+
+
+def _maxrss(who):
+    # kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _mb(n):
+    return round(n / (1024 * 1024), 1) if n else None
+
+
+# ----- synthetic inputs -----
+
+def _page_image(size, font_size, dpi=None, fmt="PNG", **kwargs):
+    from preprocess_bench import synthetic_page
+    return synthetic_page(size, font_size, dpi=dpi if fmt == "PNG" else None, **kwargs)
+
+
+def text_pdf(pages, lines_per_page=40):
+    from fpdf import FPDF
+    from preprocess_bench import SAMPLE_TEXT
+    pdf = FPDF()
+    pdf.set_font("Arial", size=10)
+    for p in range(pages):
+        pdf.add_page()
+        for line in range(lines_per_page):
+            pdf.cell(0, 6, txt=f"{p:03d}.{line:02d} {SAMPLE_TEXT}"[:110], ln=1)
+    return pdf.output(dest="S").encode("latin-1")
+
+
+def scanned_pdf(pages, workdir):
+    from fpdf import FPDF
+    pdf = FPDF()
+    paths = []
+    for p in range(pages):
+        # A4 at 150 DPI keeps the file small; the page is still OCR'd at its own DPI
+        path = os.path.join(workdir, f"scan{p}.png")
+        with open(path, "wb") as f:
+            f.write(_page_image((1240, 1754), 22, dpi=150))
+        paths.append(path)
+        pdf.add_page()
+        pdf.image(path, 0, 0, 210, 297)
+    return pdf.output(dest="S").encode("latin-1")
+
+
+def chat_history(messages):
+    from preprocess_bench import SAMPLE_TEXT
+    history = []
+    for i in range(messages):
+        if i % 10 == 0:
+            # a pasted OCR result every few turns
+            history.append({"role": "user", "content": "\n".join(f"{n} {SAMPLE_TEXT}" for n in range(60))})
+        elif i % 2:
+            history.append({"role": "assistant", "content": f"Answer {i}. " + SAMPLE_TEXT * 4})
+        else:
+            history.append({"role": "user", "content": f"Question {i}: what is the total?"})
+    return history
+
+
+# ----- scenarios -----
+# Each builds its input and returns (run, units, unit name, params, close): run()
+# is timed and may return extra numbers; units is what one run processes.
+
+def scenario_ocr(fmt, params):
+    import ocr
+    import preprocess
+    if fmt == "PNG":
+        data = _page_image((2480, 3508), 45, dpi=300)
+    else:
+        data = _page_image((4032, 3024), 64, fmt="JPEG", background=(228, 222, 205), blur=1.2)
+    opts = preprocess.options() if params.get("preprocess", True) else None
+
+    def run():
+        ocr.image_to_text(data, opts)
+    return run, 1, "images/s", {"input_bytes": len(data)}, None
+
+
+def scenario_pdf(scanned, params, workdir):
+    import pdf_ingest
+    pages = params["scan_pages"] if scanned else params["pages"]
+    data = scanned_pdf(pages, workdir) if scanned else text_pdf(pages)
+    workers = params.get("workers") or pdf_ingest.DEFAULT_WORKERS
+    executor = pdf_ingest.make_executor(workers) if workers > 1 else None
+
+    def run():
+        results = pdf_ingest.extract_pdf_pages(data, workers=workers, executor=executor)
+        methods = {}
+        for r in results:
+            methods[r.method] = methods.get(r.method, 0) + 1
+        return {"methods": methods}
+    close = executor.shutdown if executor is not None else None
+    return run, pages, "pages/s", {"pages": pages, "workers": workers, "input_bytes": len(data)}, close
+
+
+def scenario_report(params):
+    import report
+    history = chat_history(params["messages"])
+
+    def run():
+        return {"pdf_bytes": len(report.create_pdf(history))}
+    return run, len(history), "messages/s", {"messages": len(history)}, None
+
+
+def scenario_stream(params):
+    import stub_ollama
+    from backends import ClientRegistry
+    from router import OllamaBackend, Router
+    from streaming import StreamRenderer
+
+    config = stub_ollama.StubConfig(rate=params["rate"], tokens=params["tokens"], first_token_delay=0.02)
+    server, url = stub_ollama.start(config)
+    router = Router([OllamaBackend(ClientRegistry(url), "stub")])
+    payload = [
+        {"role": "system", "content": "You are a helpful AI assistant named DebAI."},
+        {"role": "user", "content": "Summarize the invoice."},
+    ]
+
+    def run():
+        # same shape as AI.generate(): router stream consumed by the throttled renderer
+        renderer = StreamRenderer(lambda text: None, interval=0.05, max_chars=200)
+        renderer.consume(router.stream(payload, {}, meta={}))
+        stats = renderer.stats()
+        return {"first_chunk_seconds": stats["first_chunk_seconds"], "tokens_per_sec": stats["tokens_per_sec"],
+                "flushes": stats["flushes"]}
+    info = {"tokens": params["tokens"], "stub_rate": params["rate"]}
+    return run, params["tokens"], "tokens/s", info, server.shutdown
+
+
+_APP_RUN = """
+import json
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("AI.py", default_timeout=120)
+at.run()
+import metrics
+runs = [r for r in metrics.METRICS.summary() if r["metric"] == "script_run_seconds"]
+print(json.dumps({"seconds": runs[0]["last"], "errors": [str(e.value) for e in at.exception]}))
+"""
+
+
+def _last_run_seconds(kind):
+    import metrics
+    for row in metrics.METRICS.summary():
+        if row["metric"] == "script_run_seconds" and row["labels"] == f"run={kind}":
+            return row["last"]
+    raise RuntimeError(f"the app recorded no {kind} run")
+
+
+def scenario_app_start(params, workdir):
+    env = dict(os.environ, DEBAI_CACHE_DIR=workdir)
+
+    def run():
+        proc = subprocess.run([sys.executable, "-c", _APP_RUN], cwd=ROOT, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        out = json.loads(proc.stdout.strip().splitlines()[-1])
+        if out["errors"]:
+            raise RuntimeError(out["errors"][0])
+        # only the app's script run, not interpreter and Streamlit start-up
+        return {"seconds": out["seconds"]}
+    return run, 1, "runs/s", {}, None
+
+
+def scenario_app_rerun(params, workdir):
+    os.environ["DEBAI_CACHE_DIR"] = workdir
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(os.path.join(ROOT, "AI.py"), default_timeout=120)
+    app.run()
+    # reruns are measured once the model warm-up (and its client import) is done
+    for thread in threading.enumerate():
+        if thread.name == "debai-model-warmup":
+            thread.join(60)
+
+    def run():
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+        # AppTest itself polls the script thread; time only the script
+        return {"seconds": _last_run_seconds("rerun")}
+    return run, 1, "runs/s", {}, None
+
+
+def build(name, params, workdir):
+    if name == "ocr_png":
+        return scenario_ocr("PNG", params)
+    if name == "ocr_jpeg":
+        return scenario_ocr("JPEG", params)
+    if name == "pdf_text":
+        return scenario_pdf(False, params, workdir)
+    if name == "pdf_scanned":
+        return scenario_pdf(True, params, workdir)
+    if name == "report":
+        return scenario_report(params)
+    if name == "stream":
+        return scenario_stream(params)
+    if name == "app_start":
+        return scenario_app_start(params, workdir)
+    if name == "app_rerun":
+        return scenario_app_rerun(params, workdir)
+    raise ValueError(f"unknown scenario {name!r} (expected one of {', '.join(SCENARIOS)})")
+
+
+def run_scenario(name, params, repeat, warmup):
+    import tempfile
+    from ocr_engines import set_tesseract_cmd
+    if params.get("tesseract_cmd"):
+        set_tesseract_cmd(params["tesseract_cmd"])
+    with tempfile.TemporaryDirectory() as workdir:
+        run, units, unit_name, info, close = build(name, params, workdir)
+        try:
+            for _ in range(warmup):
+                run()
+            times, extras = [], []
+            with PeakMemory() as memory:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    extra = run()
+                    # a scenario may time the interesting part itself
+                    times.append(extra["seconds"] if extra and "seconds" in extra else time.perf_counter() - start)
+                    if extra:
+                        extras.append(extra)
+        finally:
+            # PDF workers only count towards the children's peak once they have exited
+            if close is not None:
+                close()
+    result = {
+        "scenario": name,
+        "params": info,
+        "iterations": repeat,
+        "p50_ms": round(percentile(times, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(times, 0.95) * 1000, 2),
+        "mean_ms": round(sum(times) / len(times) * 1000, 2),
+        "throughput": round(units * len(times) / sum(times), 2),
+        "throughput_unit": unit_name,
+        "peak_rss_mb": _mb(memory.peak),
+        "peak_child_rss_mb": _mb(_maxrss(resource.RUSAGE_CHILDREN)) if resource is not None else None,
+    }
+    if extras and "first_chunk_seconds" in extras[0]:
+        first = [e["first_chunk_seconds"] for e in extras if e["first_chunk_seconds"] is not None]
+        result["first_chunk_p50_ms"] = round(percentile(first, 0.5) * 1000, 2)
+        result["first_chunk_p95_ms"] = round(percentile(first, 0.95) * 1000, 2)
+    if extras and "methods" in extras[-1]:
+        result["page_methods"] = extras[-1]["methods"]
+    if name in BUDGETS_MS:
+        result["budget_ms"] = BUDGETS_MS[name]
+        result["within_budget"] = result["p95_ms"] <= BUDGETS_MS[name]
+    return result
+
+
+def run_isolated(name, params, repeat, warmup):
+    # a fresh interpreter per scenario: clean peak memory, no warm caches from earlier ones
+    job = json.dumps({"scenario": name, "params": params, "repeat": repeat, "warmup": warmup})
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        input=job, capture_output=True, text=True, cwd=ROOT,
+    )
+    if proc.returncode != 0:
+        return {"scenario": name, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def environment():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        except OSError:
+            return ""
+    from ocr_engines import get_engine
+    return {
+        "commit": git("rev-parse", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ocr_engine": get_engine().name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def print_table(results):
+    header = f"{'scenario':<12} {'n':>3} {'p50 ms':>9} {'p95 ms':>9} {'throughput':>18} {'peak MB':>8} {'child MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['scenario']:<12} error: {r['error']}")
+            continue
+        rate = f"{r['throughput']:.1f} {r['throughput_unit']}"
+        over = "  over budget ({} ms)".format(r["budget_ms"]) if r.get("within_budget") is False else ""
+        print(
+            f"{r['scenario']:<12} {r['iterations']:>3} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {rate:>18} "
+            f"{r['peak_rss_mb'] or 0:>8.1f} {r['peak_child_rss_mb'] or 0:>8.1f}{over}"
+        )
+
+
+def print_comparison(results, baseline):
+    old = {r["scenario"]: r for r in baseline.get("results", []) if "error" not in r}
+    print()
+    print(f"change vs {str(baseline.get('environment', {}).get('commit'))[:10]} (negative p50/p95/peak is better)")
+    header = f"{'scenario':<12} {'p50':>8} {'p95':>8} {'throughput':>10} {'peak':>8}"
+    print(header)
+    print("-" * len(header))
+
+    def change(new, before):
+        if not new or not before:
+            return "-"
+        return f"{(new - before) / before:+.0%}"
+    for r in results:
+        b = old.get(r["scenario"])
+        if b is None or "error" in r:
+            continue
+        print(f"{r['scenario']:<12} {change(r['p50_ms'], b['p50_ms']):>8} {change(r['p95_ms'], b['p95_ms']):>8} "
+              f"{change(r['throughput'], b['throughput']):>10} {change(r['peak_rss_mb'], b['peak_rss_mb']):>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS, help="scenarios to run (default: all)")
+    parser.add_argument("--quick", action="store_true", help="small inputs, for a smoke run")
+    parser.add_argument("--repeat", type=int, default=None, help="timed runs per scenario (default 5, quick 3)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs first (caches, process pools)")
+    parser.add_argument("--pages", type=int, help="pages in the text PDF")
+    parser.add_argument("--scan-pages", type=int, help="pages in the scanned PDF")
+    parser.add_argument("--messages", type=int, help="chat history length for the report")
+    parser.add_argument("--tokens", type=int, help="tokens per streamed reply")
+    parser.add_argument("--rate", type=float, help="stub model speed, tokens per second (0 = unthrottled)")
+    parser.add_argument("--workers", type=int, help="PDF worker processes (default: pdf_ingest default)")
+    parser.add_argument("--no-preprocess", action="store_true", help="OCR images as uploaded")
+    parser.add_argument("--tesseract-cmd", help="path to the tesseract binary")
+    parser.add_argument("--in-process", action="store_true", help="run every scenario in this process")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--check-budgets", action="store_true", help="exit with status 1 if a budget is exceeded")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        job = json.loads(sys.stdin.read())
+        print(json.dumps(run_scenario(job["scenario"], job["params"], job["repeat"], job["warmup"])))
+        return
+
+    params = dict(SIZES["quick" if args.quick else "full"])
+    for key in ("pages", "scan_pages", "messages", "tokens", "rate", "workers", "tesseract_cmd"):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    params["preprocess"] = not args.no_preprocess
+    repeat = args.repeat or (3 if args.quick else 5)
+
+    results = []
+    for name in args.only or SCENARIOS:
+        if args.in_process:
+            results.append(run_scenario(name, params, repeat, args.warmup))
+        else:
+            results.append(run_isolated(name, params, repeat, args.warmup))
+    print_table(results)
+    report = {"environment": environment(), "config": {**params, "repeat": repeat, "warmup": args.warmup},
+              "results": results}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.check_budgets and any(r.get("within_budget") is False or "error" in r for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
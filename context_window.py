@@ -0,0 +1,91 @@
+"""Token-budgeted conversation window with a rolling summary.
+
+The most recent turns are sent verbatim while they fit in the budget. Turns
+that fall out of the window are folded into a running summary which is cached
+and only extended when the window boundary moves, so the payload (and the
+model's prompt-processing time) stays bounded however long the session gets.
+"""
+import re
+
+from retrieval import estimate_tokens
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?।])\s+")
+
+
+def message_tokens(message):
+    # a few tokens of per-message overhead for the role/template
+    return estimate_tokens(message.get("content", "")) + 4
+
+
+def extractive_summary(previous, messages, token_budget):
+    """Fold ``messages`` into ``previous`` by keeping the first sentence of each.
+
+    Runs locally without a model call; when the summary grows past
+    ``token_budget`` the oldest lines are dropped.
+    """
+    lines = [previous] if previous else []
+    for m in messages:
+        text = " ".join(m.get("content", "").split())
+        if not text:
+            continue
+        first = SENTENCE_END_RE.split(text, 1)[0]
+        if len(first) > 200:
+            first = first[:200].rstrip() + "…"
+        label = "User" if m["role"] == "user" else "Assistant"
+        lines.append(f"{label}: {first}")
+    summary = "\n".join(lines)
+    limit = token_budget * 4
+    if len(summary) > limit:
+        summary = summary[-limit:]
+        summary = summary[summary.find("\n") + 1:]
+    return summary
+
+
+class ContextWindow:
+    """Fits a message list into ``max_tokens``; keep one instance per session."""
+
+    def __init__(self, max_tokens=3000, summary_tokens=400, min_recent=4, summarize=None):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.min_recent = min_recent
+        self.summarize = summarize or extractive_summary
+        self.summary = ""
+        self.summarized_upto = 0
+        self.last_tokens = 0
+
+    def _window_start(self, body, budget):
+        used = 0
+        start = len(body)
+        for i in range(len(body) - 1, -1, -1):
+            used += message_tokens(body[i])
+            if used > budget and len(body) - i > self.min_recent:
+                break
+            start = i
+        return start
+
+    def fit(self, messages):
+        """Return the payload: system prompt, summary of older turns, recent turns."""
+        system = [m for m in messages[:1] if m["role"] == "system"]
+        body = messages[len(system):]
+        budget = self.max_tokens - self.summary_tokens - sum(message_tokens(m) for m in system)
+        start = self._window_start(body, max(budget, 0))
+
+        if start < self.summarized_upto:
+            # history was shortened (e.g. a new session); start the summary over
+            self.summary = ""
+            self.summarized_upto = 0
+        if start > self.summarized_upto:
+            self.summary = self.summarize(
+                self.summary, body[self.summarized_upto:start], self.summary_tokens
+            )
+            self.summarized_upto = start
+
+        payload = list(system)
+        if self.summary:
+            payload.append({
+                "role": "system",
+                "content": "Summary of the earlier conversation:\n" + self.summary,
+            })
+        payload.extend(body[start:])
+        self.last_tokens = sum(message_tokens(m) for m in payload)
+        return payload
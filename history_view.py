@@ -0,0 +1,43 @@
+"""Windowed view of a long chat history.
+
+Only the last ``window`` messages are rendered; older ones are reached a page
+at a time ("load earlier"), so a rerun costs the same however long the
+conversation gets. Large messages (OCR dumps) are shown as a preview of their
+first lines until the user expands them.
+"""
+import os
+
+HISTORY_WINDOW = int(os.getenv("DEBAI_HISTORY_WINDOW", "20"))
+HISTORY_PAGE = int(os.getenv("DEBAI_HISTORY_PAGE", "20"))
+PREVIEW_LINES = 15
+PREVIEW_CHARS = 2000
+
+
+def visible_start(messages, pages=0, window=HISTORY_WINDOW, page_size=HISTORY_PAGE):
+    """Index of the first message to render (the system prompt is never shown)."""
+    first = 1 if messages and messages[0]["role"] == "system" else 0
+    return max(first, len(messages) - window - pages * page_size)
+
+
+def hidden_count(messages, start):
+    return start - (1 if messages and messages[0]["role"] == "system" else 0)
+
+
+def preview(text, max_lines=PREVIEW_LINES, max_chars=PREVIEW_CHARS):
+    """``(preview, hidden_lines)``; ``hidden_lines`` is 0 when the text is short enough to show whole."""
+    end = -1
+    for _ in range(max_lines):
+        end = text.find("\n", end + 1, max_chars)
+        if end == -1:
+            break
+    if end != -1:
+        # cut after max_lines lines, unless only whitespace follows
+        if len(text) - end < max_chars and text[end:].isspace():
+            return text, 0
+        return text[:end].rstrip(), text.count("\n", end + 1) + (0 if text.endswith("\n") else 1)
+    if len(text) <= max_chars:
+        return text, 0
+    # few but long lines: cut at the last space before the limit
+    end = text.rfind(" ", 0, max_chars)
+    end = end if end > 0 else max_chars
+    return text[:end].rstrip() + " …", text.count("\n", end) + 1
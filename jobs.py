@@ -0,0 +1,190 @@
+"""Background OCR jobs so document ingestion doesn't block the chat.
+
+``OCRJobManager`` is process-wide (``st.cache_resource``) and runs OCR tasks on
+a small thread pool; PDF tasks fan their pages out further through
+``pdf_ingest``. Sessions keep only job IDs and poll them on rerun. Jobs are
+keyed by the document's OCR cache key, so the same upload is never OCR'd twice
+at the same time and finished results come straight from the cache. With a
+persistent cache a finished job keeps no text of its own (``job.text`` reads it
+back from the cache), so recent jobs don't hold a second copy of every document.
+"""
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pdf_ingest
+from metrics import observe, span
+from ocr import image_to_text
+
+# OCR jobs that may run at once (PDF pages additionally fan out to the PDF process pool)
+OCR_JOB_WORKERS = int(os.getenv("DEBAI_OCR_JOB_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+
+class OCRJob:
+    def __init__(self, job_id, doc_key, kind, name):
+        self.id = job_id
+        self.doc_key = doc_key
+        self.kind = kind
+        self.name = name
+        self.status = "queued"  # queued -> running -> done | error
+        self._text = None
+        self._cache = None  # set once the text is only kept in the OCR cache
+        self.error = None
+        self.builder = None  # PageTextBuilder for PDF jobs while they run, for progress and previews
+        self.pages = None  # page count once a PDF job has finished
+        self.timings = None
+        self.failed_pages = 0  # pages that ended in "error"; such results aren't cached
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error")
+
+    @property
+    def text(self):
+        if self._cache is not None:
+            return self._cache.get(self.doc_key, record=False)
+        return self._text
+
+    def progress(self):
+        # (pages done, total pages) for PDFs; (0, 1) / (1, 1) otherwise
+        builder = self.builder
+        if builder is not None:
+            return len(builder.results), builder.total
+        total = self.pages or 1
+        return (total if self.finished else 0), total
+
+
+def image_task(data, preprocess_options=None, image_cache=None):
+    def run(job):
+        with span("ocr_image_seconds"):
+            return image_to_text(data, preprocess_options, image_cache)
+    return run
+
+
+def pdf_task(data, **ingest_kwargs):
+    def run(job):
+        with span("pdf_extract_seconds"):
+            job.builder = pdf_ingest.PageTextBuilder(pdf_ingest.page_count(data))
+            for result in pdf_ingest.iter_pdf_pages(data, **ingest_kwargs):
+                job.builder.add(result)
+                # measured in the worker process, recorded here
+                observe("pdf_page_seconds", result.seconds, method=result.method)
+        job.failed_pages = sum(1 for r in job.builder.results.values() if r.method == "error")
+        job.pages = job.builder.total
+        job.timings = [
+            {"page": r.index + 1, "method": r.method, "seconds": round(r.seconds, 3), "chars": len(r.text)}
+            for r in job.builder.ordered()
+        ]
+        return job.builder.text()
+    return run
+
+
+def batch_key(doc_keys):
+    # identifies a set of uploads (in upload order) as one conversation entry
+    if len(doc_keys) == 1:
+        return doc_keys[0]
+    return hashlib.sha256("\n".join(doc_keys).encode("ascii")).hexdigest()
+
+
+def combine_texts(jobs):
+    """One context entry for a batch, with each file's text under its own heading."""
+    if len(jobs) == 1:
+        return jobs[0].text or ""
+    parts = []
+    for job in jobs:
+        if job.status == "done" and job.text and job.text.strip():
+            parts.append(f"### {job.name}\n\n{job.text.strip()}")
+    return "\n\n".join(parts)
+
+
+def batch_stats(jobs, started_at=None):
+    """Aggregate throughput of a batch: files, pages, wall time, pages/sec, files/sec.
+
+    ``started_at`` is when the batch was uploaded; jobs reused from the cache or
+    from another session count as instant.
+    """
+    pages = sum(j.progress()[1] for j in jobs)
+    if started_at is None:
+        started_at = min(j.submitted_at for j in jobs)
+    finished = [j.finished_at for j in jobs if j.finished_at is not None]
+    seconds = max(0.0, max(finished) - started_at) if finished else 0.0
+    return {
+        "files": len(jobs),
+        "pages": pages,
+        "failed": sum(1 for j in jobs if j.status == "error"),
+        "seconds": seconds,
+        "pages_per_sec": pages / seconds if seconds > 0 else 0.0,
+        "files_per_sec": len(jobs) / seconds if seconds > 0 else 0.0,
+    }
+
+
+class OCRJobManager:
+    def __init__(self, cache=None, max_workers=OCR_JOB_WORKERS, max_finished=256):
+        self.cache = cache
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="debai-ocr")
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # job id -> job
+        self._by_doc = {}  # doc key -> job id of the latest job for it
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def submit(self, doc_key, kind, name, task):
+        """Return the job for ``doc_key``, starting ``task(job)`` only if needed."""
+        with self._lock:
+            existing = self._jobs.get(self._by_doc.get(doc_key))
+            if existing is not None and existing.status != "error":
+                return existing
+            job = OCRJob(f"ocr-{next(self._ids)}", doc_key, kind, name)
+            self._jobs[job.id] = job
+            self._by_doc[doc_key] = job.id
+            self._evict()
+        cached = self.cache.get(doc_key) if self.cache is not None else None
+        if cached is not None:
+            self._keep_result(job, cached, cached=True)
+            job.status = "done"
+            job.finished_at = time.time()
+        else:
+            self._executor.submit(self._run, job, task)
+        return job
+
+    def _run(self, job, task):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            text = task(job)
+            # a page that failed would otherwise stay missing from the cached text for good
+            cached = self.cache is not None and not job.failed_pages
+            if cached:
+                self.cache.put(job.doc_key, text)
+            self._keep_result(job, text, cached)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "error"
+        # per-page results were only needed for progress and previews while running
+        job.builder = None
+        job.finished_at = time.time()
+
+    def _keep_result(self, job, text, cached):
+        if cached and self.cache.persistent:
+            job._cache = self.cache
+        else:
+            job._text = text
+
+    def _evict(self):
+        finished = [j for j in self._jobs.values() if j.finished]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.id]
+            if self._by_doc.get(job.doc_key) == job.id:
+                del self._by_doc[job.doc_key]
@@ -0,0 +1,50 @@
+"""The in-memory LRU behind the OCR cache, the session store and the prepared-image cache.
+
+Entries are evicted least recently used first once their sizes add up to more
+than ``max_bytes``; an entry bigger than the whole bound isn't kept at all. The
+owner passes each entry's size (characters of a text, bytes of an image) and
+holds its own lock around every call.
+"""
+from collections import OrderedDict
+
+
+class ByteLRU:
+    """Mapping bounded by the total size of its values rather than their number."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """The value for ``key`` (now the most recently used) or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, size):
+        self.pop(key)
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and self._entries:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.bytes -= entry[1]
+        return entry[0]
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
@@ -0,0 +1,226 @@
+"""Lightweight per-stage latency instrumentation.
+
+``span(name, **labels)`` times a block and ``observe(name, value, **labels)``
+records a value measured elsewhere (e.g. page timings reported by PDF worker
+processes). Every observation goes to three places:
+
+- an in-memory summary (count, sum, recent samples for p50/p95) for the sidebar;
+- a JSONL event log;
+- Prometheus text format, written to a file every few seconds (for the
+  node_exporter textfile collector) and optionally served over HTTP.
+
+The outputs are off until ``configure`` is called. The app writes the Prometheus
+file to the cache dir (``DEBAI_METRICS_FILE`` moves it) and serves it on
+``DEBAI_METRICS_PORT``. The JSONL log gets a line per rerun and per OCR'd page,
+so it is only written when ``DEBAI_METRICS_LOG`` is set, and is rotated once it
+reaches ``DEBAI_METRICS_LOG_MB``.
+
+Names ending in ``_seconds`` are durations; everything is exported as a
+histogram.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_LOG = os.getenv("DEBAI_METRICS_LOG")
+METRICS_FILE = os.getenv("DEBAI_METRICS_FILE")
+METRICS_PORT = int(os.getenv("DEBAI_METRICS_PORT", "0"))  # 0 = no HTTP endpoint
+METRICS_LOG_MB = int(os.getenv("DEBAI_METRICS_LOG_MB", "50"))  # then moved to <log>.1
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Histogram:
+    def __init__(self, buckets, recent=200):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.last = None
+        self.recent = deque(maxlen=recent)
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.last = value
+        self.recent.append(value)
+
+    def summary(self):
+        values = sorted(self.recent)
+        return {
+            "count": self.count,
+            "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95),
+            "last": self.last,
+        }
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels
+    )
+    return "{" + inner + "}"
+
+
+class Metrics:
+    def __init__(self, log_path=None, prom_path=None, flush_interval=5.0,
+                 max_log_bytes=METRICS_LOG_MB * 1024 * 1024):
+        self.log_path = log_path
+        self.prom_path = prom_path
+        self.max_log_bytes = max_log_bytes
+        self.flush_interval = flush_interval
+        self._series = {}  # (name, sorted label items) -> Histogram
+        self._lock = threading.Lock()
+        self._log = None
+        self._dirty = False
+        self._flusher = None
+        self._server = None
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        event = {"ts": round(time.time(), 3), "metric": name, "value": round(value, 6)}
+        event.update(labels)
+        with self._lock:
+            hist = self._series.get(key)
+            if hist is None:
+                buckets = LATENCY_BUCKETS if name.endswith("_seconds") else RATE_BUCKETS
+                hist = self._series[key] = Histogram(buckets)
+            hist.add(value)
+            self._dirty = True
+            if self.log_path:
+                if self._log is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                    self._log = open(self.log_path, "a", encoding="utf-8", buffering=1)
+                self._log.write(json.dumps(event, ensure_ascii=False) + "\n")
+                if self._log.tell() >= self.max_log_bytes:
+                    self._rotate_log()
+            if self.prom_path and self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="debai-metrics", daemon=True)
+                self._flusher.start()
+
+    def _rotate_log(self):
+        # one generation is kept: <log>.1 is replaced on the next rotation
+        self._log.close()
+        self._log = None
+        try:
+            os.replace(self.log_path, self.log_path + ".1")
+        except OSError:
+            pass
+
+    @contextmanager
+    def span(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            # the block may add labels (e.g. which backend answered) through the yielded dict
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def summary(self):
+        """Rows for the sidebar: one per metric and label set."""
+        with self._lock:
+            rows = []
+            for (name, labels), hist in sorted(self._series.items()):
+                row = {"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in labels)}
+                row.update(hist.summary())
+                rows.append(row)
+            return rows
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self._series})
+            for name in names:
+                metric = f"debai_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for (series_name, labels), hist in sorted(self._series.items()):
+                    if series_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                        cumulative += count
+                        le = labels + (("le", str(bound)),)
+                        lines.append(f"{metric}_bucket{_label_text(le)} {cumulative}")
+                    lines.append(f"{metric}_sum{_label_text(labels)} {hist.sum}")
+                    lines.append(f"{metric}_count{_label_text(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        path = path or self.prom_path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        # the textfile collector must never see a half-written file
+        os.replace(tmp, path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                dirty, self._dirty = self._dirty, False
+            if dirty:
+                try:
+                    self.write_prometheus()
+                except OSError:
+                    pass
+
+    def serve(self, port, host="0.0.0.0"):
+        """Serve ``/metrics`` in Prometheus text format from a background thread."""
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="debai-metrics-http", daemon=True).start()
+        return self._server
+
+
+# Process-wide registry; the app and the OCR jobs record into the same one
+METRICS = Metrics()
+
+
+def configure(log_path=None, prom_path=None, port=0):
+    METRICS.log_path = log_path
+    METRICS.prom_path = prom_path
+    if port:
+        METRICS.serve(port)
+    return METRICS
+
+
+def observe(name, value, **labels):
+    METRICS.observe(name, value, **labels)
+
+
+def span(name, **labels):
+    return METRICS.span(name, **labels)
@@ -0,0 +1,172 @@
+"""OCR helpers shared by the Streamlit app and the ``batch_ocr`` command line tool.
+
+Results are cached by a hash of the uploaded bytes plus the OCR settings, so a
+document that is still sitting in ``st.file_uploader`` is not re-OCR'd on every
+Streamlit rerun, and the same scan is only OCR'd once across restarts.
+"""
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+from lru import ByteLRU
+from ocr_engines import get_engine, tesseract_cmd as current_tesseract_cmd
+from preprocess import prepare
+from tiling import TILE_MIN_PIXELS, needs_tiling, ocr_tiled
+
+CACHE_DIR = os.getenv("DEBAI_CACHE_DIR", ".debai_cache")
+CACHE_PATH = os.path.join(CACHE_DIR, "ocr.sqlite3")
+# Bound on the in-memory LRU in front of the SQLite store (texts of any size)
+OCR_CACHE_MB = int(os.getenv("DEBAI_OCR_CACHE_MB", "64"))
+# Bound on the SQLite store; the least recently used results go first when it's pruned
+OCR_DISK_MB = int(os.getenv("DEBAI_OCR_DISK_MB", "512"))
+
+_MB = 1024 * 1024
+
+
+def ocr_settings(kind, tesseract_cmd=None, **extra):
+    # Everything that changes the OCR output of a document; the app and the CLI
+    # build it the same way so they share cache entries
+    settings = {
+        "tesseract_cmd": tesseract_cmd or current_tesseract_cmd(),
+        "kind": kind,
+        "engine": get_engine().name,
+    }
+    if kind == "image":
+        settings["tile_min_pixels"] = TILE_MIN_PIXELS
+    settings.update(extra)
+    return settings
+
+
+def image_to_text(data, preprocess_options=None, image_cache=None):
+    # preprocess_options=None OCRs the image exactly as uploaded
+    image = Image.open(io.BytesIO(data))  # lazy: only the header is read here
+    if needs_tiling(image):
+        return ocr_tiled(data, preprocess_options)
+    if preprocess_options is not None and image_cache is not None:
+        image = image_cache.prepare(data, preprocess_options)
+    elif preprocess_options is not None:
+        image = prepare(image, preprocess_options)
+    return get_engine().image_to_text(image)
+
+
+def cache_key(data, settings=None):
+    # Hash the raw bytes together with every setting that changes the OCR output
+    h = hashlib.sha256()
+    h.update(data)
+    h.update(json.dumps(settings or {}, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+class OCRCache:
+    """Two-level OCR result cache: in-memory LRU (bounded in bytes) in front of a SQLite store."""
+
+    def __init__(self, path=None, max_bytes=OCR_CACHE_MB * _MB):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = ByteLRU(max_bytes)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr "
+                "(key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, used_at REAL NOT NULL)"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(ocr)")]
+            if "used_at" not in columns:
+                # caches written before results were sized and dated
+                self._db.execute("ALTER TABLE ocr ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                self._db.execute("ALTER TABLE ocr ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+                self._db.execute("UPDATE ocr SET size = LENGTH(text), used_at = ?", (time.time(),))
+            self._db.commit()
+
+    @property
+    def persistent(self):
+        # entries of a persistent cache can be read back after leaving the memory LRU
+        return self._db is not None
+
+    def get(self, key, record=True):
+        """The cached text for ``key`` or None; ``record=False`` leaves the hit/miss stats alone."""
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                if record:
+                    self.hits += 1
+                return text
+            if self._db is not None:
+                row = self._db.execute("SELECT text FROM ocr WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE ocr SET used_at = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._memory.put(key, row[0], len(row[0]))
+                    if record:
+                        self.hits += 1
+                        self.disk_hits += 1
+                    return row[0]
+            if record:
+                self.misses += 1
+            return None
+
+    def put(self, key, text):
+        with self._lock:
+            self._memory.put(key, text, len(text))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ocr (key, text, size, used_at) VALUES (?, ?, ?, ?)",
+                    (key, text, len(text), time.time()),
+                )
+                self._db.commit()
+
+    def prune(self, max_bytes=OCR_DISK_MB * _MB):
+        """Delete the least recently used results until the store holds at most ``max_bytes``.
+
+        Returns how many were removed.
+        """
+        if self._db is None:
+            return 0
+        with self._lock:
+            total = 0
+            stale = []
+            for key, size in self._db.execute("SELECT key, size FROM ocr ORDER BY used_at DESC"):
+                total += size
+                if total > max_bytes:
+                    stale.append((key,))
+            self._db.executemany("DELETE FROM ocr WHERE key = ?", stale)
+            self._db.commit()
+            return len(stale)
+
+    def get_or_compute(self, data, settings, compute):
+        key = cache_key(data, settings)
+        text = self.get(key)
+        if text is None:
+            text = compute()
+            self.put(key, text)
+        return text
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_items": len(self._memory),
+                "memory_mb": self._memory.bytes / _MB,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM ocr")
+                self._db.commit()
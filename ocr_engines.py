@@ -0,0 +1,155 @@
+"""OCR engines behind a single ``image_to_text(image)`` call.
+
+``pytesseract`` starts a ``tesseract`` process and round-trips the image through
+temp files on every call, so on short pages process start-up and model loading
+cost more than the recognition itself. ``TesserocrEngine`` talks to libtesseract
+through ``tesserocr`` and keeps a small pool of initialised APIs (model loaded)
+for the life of the process; PDF worker processes each keep their own. When
+``tesserocr`` isn't installed or can't find its language data, ``get_engine``
+falls back to ``PytesseractEngine``.
+
+``DEBAI_OCR_ENGINE`` selects the engine: "auto" (default), "tesserocr" or
+"pytesseract".
+
+Both libraries are imported on first use (pytesseract alone takes ~0.4 s, it
+pulls in pandas when installed), so the app starts without them; the path to
+the tesseract binary is kept here until then (``set_tesseract_cmd``).
+"""
+import importlib.util
+import os
+import queue
+import sys
+import threading
+
+TESSEROCR_AVAILABLE = importlib.util.find_spec("tesserocr") is not None
+
+ENGINES = ("auto", "tesserocr", "pytesseract")
+OCR_ENGINE = os.getenv("DEBAI_OCR_ENGINE", "auto")
+# Initialised Tesseract APIs per process, i.e. OCR calls that can run at once
+OCR_ENGINE_POOL = int(os.getenv("DEBAI_OCR_ENGINE_POOL", "0")) or min(4, os.cpu_count() or 1)
+TESSDATA_PATH = os.getenv("TESSDATA_PREFIX")
+OCR_LANG = os.getenv("DEBAI_OCR_LANG", "eng")
+
+_tesseract_cmd = None
+
+
+def set_tesseract_cmd(cmd):
+    global _tesseract_cmd
+    _tesseract_cmd = cmd
+    if "pytesseract" in sys.modules:
+        sys.modules["pytesseract"].pytesseract.tesseract_cmd = cmd
+
+
+def tesseract_cmd():
+    if _tesseract_cmd:
+        return _tesseract_cmd
+    if "pytesseract" in sys.modules:
+        # set directly on pytesseract by a caller that imported it itself
+        return sys.modules["pytesseract"].pytesseract.tesseract_cmd
+    return "tesseract"
+
+
+def load_pytesseract():
+    import pytesseract
+    if _tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = _tesseract_cmd
+    return pytesseract
+
+
+class PytesseractEngine:
+    name = "pytesseract"
+    persistent = False
+
+    def __init__(self, fallback_reason=None):
+        # why the persistent engine couldn't be used, if that was the plan
+        self.fallback_reason = fallback_reason
+
+    def image_to_text(self, image):
+        return load_pytesseract().image_to_string(image, lang=OCR_LANG).strip()
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine:
+    """Pool of ``tesserocr.PyTessBaseAPI`` objects; each one is used by one call at a time."""
+
+    name = "tesserocr"
+    persistent = True
+    fallback_reason = None
+
+    def __init__(self, size=OCR_ENGINE_POOL, path=TESSDATA_PATH, lang=OCR_LANG):
+        self.size = max(1, size)
+        self.path = path
+        self.lang = lang
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # Create one API up front so a missing library or language pack fails here
+        self._idle.put(self._new_api())
+
+    def _new_api(self):
+        import tesserocr
+        kwargs = {"lang": self.lang}
+        if self.path:
+            kwargs["path"] = self.path
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        self._created += 1
+        return api
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                return self._new_api()
+        return self._idle.get()
+
+    def image_to_text(self, image):
+        api = self._acquire()
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text().strip()
+        finally:
+            api.Clear()
+            self._idle.put(api)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().End()
+            except queue.Empty:
+                return
+
+
+def make_engine(name=OCR_ENGINE, pool_size=OCR_ENGINE_POOL):
+    if name not in ENGINES:
+        raise ValueError(f"unknown OCR engine {name!r} (expected one of {', '.join(ENGINES)})")
+    if name == "pytesseract":
+        return PytesseractEngine()
+    if not TESSEROCR_AVAILABLE:
+        return PytesseractEngine("tesserocr is not installed")
+    try:
+        return TesserocrEngine(pool_size)
+    except Exception as e:
+        return PytesseractEngine(f"tesserocr failed to start: {e}")
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The process-wide engine, created on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = make_engine()
+        return _engine
+
+
+def current_engine():
+    """The engine if something has been OCR'd in this process, else None."""
+    return _engine
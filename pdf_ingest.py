@@ -0,0 +1,299 @@
+"""Parallel per-page PDF text extraction with an OCR fallback.
+
+Pages are fanned out to a ``ProcessPoolExecutor``. Each worker opens the PDF
+itself (pdfplumber objects can't be pickled), runs ``extract_text()`` and only
+rasterizes + OCRs the page when it has no text layer. The rendering DPI is
+picked per page from its size and a cheap low-resolution probe of how big the
+text is, and pages the probe finds blank are skipped. Pages that do have a text
+layer but also carry large images (a scanned figure, a pasted screenshot) get
+only those image regions OCR'd. At most ``max_in_flight``
+pages are submitted at once, which bounds how many rasterized pages can be held
+in memory. Results are yielded as soon as each page finishes; ``PageTextBuilder``
+puts them back in page order so the UI can show page 1 while later pages are
+still being OCR'd.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from ocr_engines import get_engine, set_tesseract_cmd, tesseract_cmd as current_tesseract_cmd
+from preprocess import DEFAULT_OPTIONS, prepare, text_profile
+
+log = logging.getLogger(__name__)
+
+DEFAULT_RESOLUTION = 300  # upper bound when adaptive, otherwise used for every page
+MIN_RESOLUTION = 100
+PROBE_RESOLUTION = 50
+# Large-format pages are rendered at a lower DPI so one page stays below this size
+MAX_PAGE_PIXELS = 9_000_000  # A4 at 300 DPI is about 8.7 MP
+BLANK_INK_RATIO = 0.002  # pages with less ink than this in the probe are treated as blank
+MIN_REGION_AREA = 0.05  # image regions smaller than this fraction of the page aren't OCR'd
+DEFAULT_WORKERS = int(os.getenv("DEBAI_PDF_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# method is "text" (text layer), "text+ocr" (text layer plus OCR'd image regions),
+# "ocr" (rasterized + Tesseract), "blank" (skipped by the probe), "empty" or "error";
+# error holds the exception text of an "error" page
+PageResult = namedtuple("PageResult", ["index", "text", "method", "seconds", "error"], defaults=(None,))
+
+# Per-worker handle on the PDF currently being processed, so a worker parses each
+# document once instead of once per page. Thread-local: inline extraction runs on
+# several background job threads at once, and each must keep its own document open
+_open_pdf = threading.local()
+
+
+def _get_pdf(path):
+    if getattr(_open_pdf, "path", None) != path:
+        _release_pdf()
+        import pdfplumber
+        # Parsed from memory so the worker holds no file handle between tasks: it
+        # can't tell which page of a document is its last, and an open handle
+        # keeps the temp file from being deleted on Windows
+        with open(path, "rb") as f:
+            data = f.read()
+        _open_pdf.pdf = pdfplumber.open(io.BytesIO(data))
+        _open_pdf.path = path
+    return _open_pdf.pdf
+
+
+def _release_pdf():
+    if getattr(_open_pdf, "pdf", None) is not None:
+        _open_pdf.pdf.close()
+    _open_pdf.path = None
+    _open_pdf.pdf = None
+
+
+def choose_resolution(page, max_resolution=DEFAULT_RESOLUTION, target_line_height=None):
+    """Return the DPI to OCR ``page`` (or a cropped region) at, or None if it looks blank."""
+    target_line_height = target_line_height or DEFAULT_OPTIONS["target_line_height"]
+    probe = page.to_image(resolution=PROBE_RESOLUTION).original
+    ink, line_height = text_profile(probe)
+    if ink < BLANK_INK_RATIO:
+        return None
+    # Big pages: keep the rendered bitmap under MAX_PAGE_PIXELS
+    area_inches = (float(page.width) / 72) * (float(page.height) / 72)
+    dpi = min(max_resolution, (MAX_PAGE_PIXELS / max(area_inches, 1e-6)) ** 0.5)
+    if line_height:
+        # Just enough resolution for text lines to be target_line_height pixels tall
+        dpi = min(dpi, PROBE_RESOLUTION * target_line_height / line_height)
+    return int(max(min(MIN_RESOLUTION, max_resolution), dpi))
+
+
+def _ocr_region(region, resolution, preprocess_options):
+    image = region.to_image(resolution=resolution).original
+    if preprocess_options is not None:
+        image = prepare(image, preprocess_options)
+    return get_engine().image_to_text(image)
+
+
+def _image_regions(page):
+    # Bounding boxes of large embedded images that the text layer doesn't already cover
+    page_area = float(page.width) * float(page.height)
+    regions = []
+    for img in page.images:
+        x0, top = max(img["x0"], page.bbox[0]), max(img["top"], page.bbox[1])
+        x1, bottom = min(img["x1"], page.bbox[2]), min(img["bottom"], page.bbox[3])
+        if x1 <= x0 or bottom <= top or (x1 - x0) * (bottom - top) < MIN_REGION_AREA * page_area:
+            continue
+        bbox = (x0, top, x1, bottom)
+        # searchable scans carry an invisible text layer over the image; nothing to add
+        if len(page.within_bbox(bbox).chars) > 20:
+            continue
+        regions.append(bbox)
+    return regions
+
+
+def extract_page(page, resolution=DEFAULT_RESOLUTION, preprocess_options=None, adaptive=True):
+    """Return ``(text, method)`` for a single pdfplumber page.
+
+    With ``adaptive`` the DPI is chosen per page (``resolution`` is the maximum),
+    blank pages are skipped and text pages get their large images OCR'd. Raises
+    if a page without a text layer can't be OCR'd.
+    """
+    target = (preprocess_options or DEFAULT_OPTIONS).get("target_line_height")
+    text = page.extract_text()
+    if text:
+        if not adaptive:
+            return text, "text"
+        parts = [text]
+        for bbox in _image_regions(page):
+            region = page.crop(bbox)
+            try:
+                dpi = choose_resolution(region, resolution, target)
+                region_text = _ocr_region(region, dpi, preprocess_options) if dpi else ""
+            except Exception:
+                continue
+            if region_text:
+                parts.append(region_text)
+        return "\n".join(parts), "text+ocr" if len(parts) > 1 else "text"
+    # If no text found, try OCR on the page image to capture embedded text
+    if adaptive:
+        resolution = choose_resolution(page, resolution, target)
+        if resolution is None:
+            return "", "blank"
+    ocr_text = _ocr_region(page, resolution, preprocess_options)
+    return ocr_text, "ocr" if ocr_text else "empty"
+
+
+def _page_task(path, index, resolution, tesseract_cmd, preprocess_options=None, adaptive=True):
+    # Runs inside a worker process
+    if tesseract_cmd:
+        set_tesseract_cmd(tesseract_cmd)
+    start = time.perf_counter()
+    try:
+        text, method = extract_page(_get_pdf(path).pages[index], resolution, preprocess_options, adaptive)
+    except Exception as e:
+        # the rest of the document is still extracted; callers see which pages failed and why
+        return PageResult(index, "", "error", time.perf_counter() - start, f"{type(e).__name__}: {e}")
+    return PageResult(index, text, method, time.perf_counter() - start)
+
+
+def submit_page(executor, path, index, resolution=DEFAULT_RESOLUTION, tesseract_cmd=None,
+                preprocess_options=None, adaptive=True):
+    """Queue page ``index`` of the PDF file at ``path``; the future's result is a ``PageResult``.
+
+    For callers that schedule pages of several documents on one pool themselves.
+    """
+    return executor.submit(
+        _page_task, path, index, resolution, tesseract_cmd or current_tesseract_cmd(), preprocess_options, adaptive
+    )
+
+
+def make_executor(workers=None):
+    # spawn rather than fork: the Streamlit server is multi-threaded
+    return ProcessPoolExecutor(
+        max_workers=workers or DEFAULT_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def page_count(data):
+    # imported here rather than at the top: the app only needs it once a PDF is uploaded
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        return len(pdf.pages)
+
+
+def _run_inline(path, pages, resolution, tesseract_cmd, preprocess_options, adaptive):
+    try:
+        for index in pages:
+            yield _page_task(path, index, resolution, tesseract_cmd, preprocess_options, adaptive)
+    finally:
+        _release_pdf()
+
+
+def _run_pool(executor, path, pages, resolution, tesseract_cmd, preprocess_options, adaptive, max_in_flight):
+    pending = set()
+    remaining = iter(pages)
+    try:
+        while True:
+            # Top up the window so at most max_in_flight pages are being rasterized
+            for index in remaining:
+                pending.add(
+                    executor.submit(_page_task, path, index, resolution, tesseract_cmd, preprocess_options, adaptive)
+                )
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def iter_pdf_pages(data, pages=None, workers=None, resolution=DEFAULT_RESOLUTION,
+                   tesseract_cmd=None, executor=None, max_in_flight=None, preprocess_options=None,
+                   adaptive=True):
+    """Yield a ``PageResult`` per page of ``data`` (PDF bytes) in completion order.
+
+    ``pages`` restricts processing to the given 0-based page indices (default:
+    every page). With ``workers == 1`` and no ``executor`` pages are processed
+    inline; when an ``executor`` is passed, ``workers`` should be its size.
+    ``preprocess_options`` (see ``preprocess``) is applied to pages that have to
+    be OCR'd; ``adaptive`` is passed on to ``extract_page``.
+    """
+    if pages is None:
+        pages = range(page_count(data))
+    workers = workers or DEFAULT_WORKERS
+    max_in_flight = max_in_flight or workers * 2
+    tesseract_cmd = tesseract_cmd or current_tesseract_cmd()
+
+    # Workers read the document from disk rather than receiving a copy per page
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    own_executor = None
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        if executor is None and workers <= 1:
+            yield from _run_inline(path, pages, resolution, tesseract_cmd, preprocess_options, adaptive)
+            return
+        if executor is None:
+            executor = own_executor = make_executor(workers)
+        yield from _run_pool(
+            executor, path, pages, resolution, tesseract_cmd, preprocess_options, adaptive, max_in_flight
+        )
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown(wait=True, cancel_futures=True)
+        try:
+            os.remove(path)
+        except OSError as e:
+            log.warning("could not remove temporary PDF %s: %s", path, e)
+
+
+def extract_pdf_pages(data, **kwargs):
+    """Process every page of ``data`` and return the results in page order."""
+    return sorted(iter_pdf_pages(data, **kwargs), key=lambda r: r.index)
+
+
+def join_pages(results):
+    return "".join([r.text + "\n" for r in results if r.text])
+
+
+class PageTextBuilder:
+    """Collects out-of-order ``PageResult``s and releases them in page order."""
+
+    def __init__(self, total):
+        self.total = total
+        self.results = {}
+        self._next = 0
+
+    def add(self, result):
+        self.results[result.index] = result
+
+    @property
+    def done(self):
+        return len(self.results) >= self.total
+
+    def remaining(self):
+        return [i for i in range(self.total) if i not in self.results]
+
+    def pop_ready(self):
+        # Results that now form a contiguous run after the last one released
+        ready = []
+        while self._next in self.results:
+            ready.append(self.results[self._next])
+            self._next += 1
+        return ready
+
+    def contiguous(self):
+        # Pages 0..n-1 that are all done; safe to call while another thread adds results
+        results = dict(self.results)
+        ready = []
+        while len(ready) in results:
+            ready.append(results[len(ready)])
+        return ready
+
+    def ordered(self):
+        return [self.results[i] for i in sorted(self.results)]
+
+    def text(self):
+        return join_pages(self.ordered())
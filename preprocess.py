@@ -0,0 +1,226 @@
+"""Pillow preprocessing applied to images before Tesseract.
+
+Phone photos and high-DPI scans are far bigger than Tesseract needs: OCR time
+grows with the pixel count while accuracy stops improving once characters are a
+few dozen pixels tall. ``prepare`` scales the image down to a target DPI or
+text-line height, converts it to grayscale, binarizes it with a local (adaptive)
+threshold and can optionally straighten a skewed page. Everything is done with
+Pillow's C filters, no per-pixel Python loops.
+
+Options are a plain dict (see ``DEFAULT_OPTIONS``) so they can be hashed into the
+OCR cache key. ``ProcessedImageCache`` keeps recently prepared images in
+memory, keyed by the source bytes and the options.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps, ImageStat
+
+from lru import ByteLRU
+
+DEFAULT_OPTIONS = {
+    "target_dpi": 300,  # scale down images that declare a higher DPI
+    "target_line_height": 40,  # px; scale down so text lines are about this tall
+    "min_scale": 0.25,
+    "grayscale": True,
+    "threshold": True,  # adaptive (local mean) binarization
+    "threshold_radius": 15,
+    "threshold_offset": 10,
+    "deskew": False,
+    "max_skew": 5.0,  # degrees searched either way when deskewing
+}
+
+# Memory bound of ProcessedImageCache
+PREPARED_CACHE_MB = int(os.getenv("DEBAI_PREPARED_CACHE_MB", "64"))
+
+# Height the line-height and skew probes work at
+_PROBE_HEIGHT = 1600
+
+
+def options(**overrides):
+    opts = dict(DEFAULT_OPTIONS)
+    opts.update(overrides)
+    return opts
+
+
+def binarize(gray, radius, offset):
+    # A pixel is ink when it is darker than its neighbourhood mean by more than offset
+    background = gray.filter(ImageFilter.BoxBlur(radius))
+    darker = ImageChops.subtract(background, gray)
+    return darker.point(lambda v: 0 if v > offset else 255)
+
+
+def row_ink(binary):
+    # Mean of each row (0 = all ink, 255 = blank), computed by resizing to one column
+    column = binary.resize((1, binary.height), Image.BOX)
+    return list(column.getdata())
+
+
+def _probe(gray, opts):
+    factor = min(1.0, _PROBE_HEIGHT / gray.height)
+    if factor < 1.0:
+        gray = gray.resize((max(1, round(gray.width * factor)), _PROBE_HEIGHT), Image.BILINEAR)
+    radius = max(1, round(opts["threshold_radius"] * factor))
+    return binarize(gray, radius, opts["threshold_offset"]), factor
+
+
+def estimate_line_height(binary):
+    """Median height in px of the runs of rows that contain ink, or None."""
+    runs = []
+    run = 0
+    for value in row_ink(binary) + [255]:
+        if value < 250:  # at least ~2% of the row is ink
+            run += 1
+        elif run:
+            if run >= 2:
+                runs.append(run)
+            run = 0
+    if len(runs) < 3:
+        return None
+    runs.sort()
+    return runs[len(runs) // 2]
+
+
+def estimate_skew(binary, max_skew=5.0, step=0.5):
+    """Angle in degrees that makes text lines most horizontal."""
+    # Level text gives the sharpest row profile: ink rows next to blank gaps
+    best_angle, best_score = 0.0, None
+    steps = int(max_skew / step)
+    for i in range(-steps, steps + 1):
+        angle = i * step
+        rotated = binary.rotate(angle, resample=Image.NEAREST, fillcolor=255)
+        rows = row_ink(rotated)
+        score = sum((a - b) ** 2 for a, b in zip(rows, rows[1:]))
+        if best_score is None or score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def text_profile(image, opts=None):
+    """``(ink_ratio, line_height)`` of an image at its own resolution.
+
+    ``ink_ratio`` is the fraction of pixels the adaptive threshold marks as ink;
+    ``line_height`` is None when no text lines can be made out.
+    """
+    opts = DEFAULT_OPTIONS if opts is None else opts
+    gray = ImageOps.grayscale(image)
+    radius = max(1, min(opts["threshold_radius"], gray.height // 20))
+    binary = binarize(gray, radius, opts["threshold_offset"])
+    ink = 1.0 - ImageStat.Stat(binary).mean[0] / 255.0
+    return ink, estimate_line_height(binary)
+
+
+def target_scale(image, opts, line_height=None):
+    scale = 1.0
+    dpi = image.info.get("dpi")
+    if opts.get("target_dpi") and dpi and dpi[0]:
+        scale = min(scale, opts["target_dpi"] / float(dpi[0]))
+    if opts.get("target_line_height") and line_height:
+        scale = min(scale, opts["target_line_height"] / line_height)
+    return max(scale, opts.get("min_scale") or 0.0)
+
+
+def prepare(image, opts=None):
+    """Return the image Tesseract should see. ``opts`` defaults to ``DEFAULT_OPTIONS``."""
+    opts = DEFAULT_OPTIONS if opts is None else opts
+    # phone photos are often stored sideways with an EXIF rotation flag
+    image = ImageOps.exif_transpose(image)
+    gray = ImageOps.grayscale(image)
+
+    line_height = None
+    angle = 0.0
+    if opts.get("target_line_height") or opts.get("deskew"):
+        binary, factor = _probe(gray, opts)
+        if opts.get("deskew"):
+            angle = estimate_skew(binary, opts.get("max_skew", 5.0))
+            if angle:
+                binary = binary.rotate(angle, resample=Image.NEAREST, fillcolor=255)
+        if opts.get("target_line_height"):
+            probed = estimate_line_height(binary)
+            line_height = probed / factor if probed else None
+
+    scale = target_scale(image, opts, line_height)
+    if scale < 1.0:
+        size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+        gray = gray.resize(size, Image.LANCZOS)
+        if not opts.get("grayscale"):
+            image = image.resize(size, Image.LANCZOS)
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+        if not opts.get("grayscale"):
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor="white")
+
+    if opts.get("threshold"):
+        radius = max(1, round(opts["threshold_radius"] * min(1.0, scale)))
+        return binarize(gray, radius, opts["threshold_offset"])
+    if opts.get("grayscale"):
+        return gray
+    return image
+
+
+def thumbnail(data, max_side=1024, quality=85):
+    """JPEG bytes of a preview at most ``max_side`` pixels wide or tall."""
+    image = Image.open(io.BytesIO(data))
+    # JPEGs are decoded at a reduced scale instead of in full
+    image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def options_key(data, opts):
+    h = hashlib.sha256()
+    h.update(data)
+    h.update(json.dumps(opts, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ProcessedImageCache:
+    """Prepared images, kept in memory (LRU bounded in bytes) and keyed by source bytes and options.
+
+    The OCR cache already answers repeat uploads with the same settings, so this
+    only saves work when the same image is OCR'd again without an OCR cache hit:
+    a retry after a failed job, or another engine or tesseract binary. It keeps
+    the prepared ``Image`` itself; nothing is encoded or written to disk.
+    """
+
+    def __init__(self, max_bytes=PREPARED_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = ByteLRU(max_bytes)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._memory.get(key)
+            if image is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return image
+
+    def put(self, key, image):
+        # mode "1" packs 8 pixels per byte; L, RGB etc. use one byte per band
+        size = image.width * image.height * len(image.getbands())
+        if image.mode == "1":
+            size //= 8
+        with self._lock:
+            self._memory.put(key, image, size)
+
+    def prepare(self, data, opts=None):
+        """``prepare`` for encoded image bytes, reusing an earlier result when there is one."""
+        opts = DEFAULT_OPTIONS if opts is None else opts
+        key = options_key(data, opts)
+        image = self.get(key)
+        if image is None:
+            image = prepare(Image.open(io.BytesIO(data)), opts)
+            self.put(key, image)
+        return image
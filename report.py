@@ -0,0 +1,111 @@
+"""PDF export of a chat session.
+
+``SessionReport`` keeps the laid-out FPDF document between calls and only lays
+out messages that were appended since the last export; the finished bytes are
+memoized on a fingerprint of the message list. fpdf is imported on the first
+export, not when the app starts.
+"""
+import copy
+import threading
+
+from metrics import span
+
+_pdf_class = None
+
+
+def pdf_class():
+    global _pdf_class
+    if _pdf_class is None:
+        from fpdf import FPDF
+
+        class PDF(FPDF):
+            def header(self):
+                self.set_font('Arial', 'B', 15)
+                self.cell(0, 10, 'DebAI Session Report', 0, 1, 'C')
+                self.ln(10)
+
+            def footer(self):
+                self.set_y(-15)
+                self.set_font('Arial', 'I', 8)
+                self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+        _pdf_class = PDF
+    return _pdf_class
+
+
+def message_fingerprint(msg):
+    # Messages kept in the session store are identified by their content hash; str
+    # hashes are cached on the string object, so inline ones stay cheap too
+    return hash((msg["role"], msg.get("ref") or msg["content"]))
+
+
+def _new_pdf():
+    pdf = pdf_class()()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    return pdf
+
+
+def _append_message(pdf, msg, text):
+    role = msg["role"].upper()
+    # Simple sanitization for latin-1
+    content = text(msg).encode('latin-1', 'replace').decode('latin-1')
+
+    if role == "USER":
+        pdf.set_text_color(59, 130, 246) # Blue
+    else:
+        pdf.set_text_color(100, 100, 100) # Gray
+
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 10, txt=f"{role}:", ln=True)
+
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", size=12)
+    pdf.multi_cell(0, 10, txt=content)
+    pdf.ln(5)
+
+
+class SessionReport:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pdf = None
+        self._fingerprints = []
+        self._output = None
+        self.builds = 0
+        self.appended = 0
+
+    def build(self, messages, text=None):
+        """Return the PDF bytes for ``messages`` (system messages are skipped).
+
+        ``text(msg)`` returns a message's text; it is only called for messages that
+        still have to be laid out, so stored texts are not read back for every export.
+        """
+        text = text or (lambda msg: msg["content"])
+        visible = [m for m in messages if m["role"] != "system"]
+        fingerprints = [message_fingerprint(m) for m in visible]
+        with self._lock, span("report_build_seconds") as labels:
+            labels["mode"] = "memoized"
+            if self._output is not None and fingerprints == self._fingerprints:
+                return self._output
+            labels["mode"] = "incremental"
+            known = len(self._fingerprints)
+            if self._pdf is None or fingerprints[:known] != self._fingerprints:
+                # an earlier message changed; lay the document out again
+                self._pdf = _new_pdf()
+                self._fingerprints = []
+                known = 0
+                self.builds += 1
+                labels["mode"] = "full"
+            for msg in visible[known:]:
+                _append_message(self._pdf, msg, text)
+                self.appended += 1
+            self._fingerprints = fingerprints
+            # output() closes the document (footer, trailer), so finish a copy and
+            # keep the open one for the next append
+            finished = copy.deepcopy(self._pdf)
+            self._output = finished.output(dest='S').encode('latin-1')
+            return self._output
+
+
+def create_pdf(messages):
+    return SessionReport().build(messages)
@@ -0,0 +1,89 @@
+"""Cache of complete model answers for repeated prompts.
+
+Entries are keyed by the backend (its name includes the model, e.g.
+``ollama:gemma3:1b``) and a hash of the normalized payload: every message's role
+and content with whitespace collapsed, including the language instruction that
+is appended to the last message. Entries expire after ``ttl`` seconds and the
+least recently used ones are evicted beyond ``max_items``. Only answers that
+streamed to completion are stored.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+RESPONSE_CACHE_ENABLED = os.getenv("DEBAI_RESPONSE_CACHE", "0").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_TTL = float(os.getenv("DEBAI_RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("DEBAI_RESPONSE_CACHE_SIZE", "256"))
+
+CachedResponse = namedtuple("CachedResponse", ["backend", "text", "seconds", "created_at"])
+
+
+def normalize(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def payload_key(backend, messages):
+    body = [[m["role"], normalize(m["content"])] for m in messages]
+    h = hashlib.sha256()
+    h.update(backend.encode("utf-8"))
+    h.update(json.dumps(body, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_items=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, clock=time.monotonic):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, backends, messages):
+        """First live entry for ``messages`` among ``backends`` (names, in preference order)."""
+        now = self.clock()
+        with self._lock:
+            for backend in backends:
+                key = payload_key(backend, messages)
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if now - entry.created_at > self.ttl:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry.seconds
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, backend, messages, text, seconds):
+        entry = CachedResponse(backend, text, seconds, self.clock())
+        with self._lock:
+            key = payload_key(backend, messages)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "items": len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,169 @@
+"""Local chunked retrieval over uploaded documents.
+
+Documents are split into overlapping word-window chunks and indexed in an
+in-memory inverted index scored with BM25. On each chat turn only the top-k
+chunks relevant to the question are sent to the model, capped by a token
+budget, so the prompt size no longer grows with the size of the uploads.
+Everything runs locally; nothing is sent over the network.
+
+Given a ``store`` (``session_store.BlobStore``), the chunk texts of each
+document are kept there as one blob and only the postings stay in memory; the
+texts are read back for the chunks a query actually picks.
+"""
+import json
+import math
+import re
+from collections import Counter, namedtuple
+
+# \w alone splits Devanagari/Bengali words on their vowel signs
+WORD_RE = re.compile(r"[\w\u0900-\u09FF]+", re.UNICODE)
+
+Chunk = namedtuple("Chunk", ["doc_id", "index", "text", "tokens"])
+
+
+def tokenize(text):
+    return [w.lower() for w in WORD_RE.findall(text)]
+
+
+def estimate_tokens(text):
+    # Rough but cheap: ~4 characters per token for the models we use
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+def chunk_text(text, max_tokens=200, overlap=40):
+    """Split ``text`` into word windows of about ``max_tokens`` tokens."""
+    words = text.split()
+    if not words:
+        return []
+    # Word count per window that keeps each chunk near the token target
+    avg = max(1.0, estimate_tokens(text) / len(words))
+    size = max(1, int(max_tokens / avg))
+    step = max(1, size - int(overlap / avg))
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + size]))
+        if start + size >= len(words):
+            break
+    return chunks
+
+
+class BM25Index:
+    """Incremental inverted index with BM25 scoring."""
+
+    def __init__(self, k1=1.5, b=0.75, chunk_tokens=200, chunk_overlap=40, store=None):
+        self.k1 = k1
+        self.b = b
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.chunks = []
+        self.postings = {}  # term -> {chunk id: term frequency}
+        self.lengths = []
+        self.live = 0  # chunks not removed
+        self.docs = {}  # doc id -> list of chunk ids
+        self.store = store
+        self.doc_refs = {}  # doc id -> store ref of its chunk texts (with a store)
+        self._total_length = 0
+
+    def __contains__(self, doc_id):
+        return doc_id in self.docs
+
+    def add_document(self, doc_id, text):
+        if doc_id in self.docs:
+            return self.docs[doc_id]
+        ids = []
+        pieces = chunk_text(text, self.chunk_tokens, self.chunk_overlap)
+        if self.store is not None:
+            self.doc_refs[doc_id] = self.store.put(json.dumps(pieces, ensure_ascii=False))
+        for i, piece in enumerate(pieces):
+            chunk_id = len(self.chunks)
+            kept = piece if self.store is None else None
+            self.chunks.append(Chunk(doc_id, i, kept, estimate_tokens(piece)))
+            terms = Counter(tokenize(piece))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[chunk_id] = tf
+            length = sum(terms.values())
+            self.lengths.append(length)
+            self._total_length += length
+            ids.append(chunk_id)
+        self.docs[doc_id] = ids
+        self.live += len(ids)
+        return ids
+
+    def remove_document(self, doc_id, release=False):
+        """Drop a document from the index; its slots in ``chunks`` are left as None.
+
+        With ``release`` its chunk texts are released from the store as well, for
+        short-lived documents such as the pages of a file still being OCR'd.
+        """
+        ref = self.doc_refs.pop(doc_id, None)
+        if release and ref is not None:
+            self.store.release(ref)
+        ids = self.docs.pop(doc_id, None)
+        if not ids:
+            return
+        removed = set(ids)
+        for term in list(self.postings):
+            posting = self.postings[term]
+            for chunk_id in removed.intersection(posting):
+                del posting[chunk_id]
+            if not posting:
+                del self.postings[term]
+        for chunk_id in ids:
+            self._total_length -= self.lengths[chunk_id]
+            self.lengths[chunk_id] = 0
+            self.chunks[chunk_id] = None
+        self.live -= len(ids)
+
+    def _with_text(self, chunks):
+        # chunks whose text lives in the store get it back, one store read per document
+        texts = {}
+        filled = []
+        for chunk in chunks:
+            if chunk.text is None:
+                if chunk.doc_id not in texts:
+                    texts[chunk.doc_id] = json.loads(self.store.get(self.doc_refs[chunk.doc_id]))
+                chunk = chunk._replace(text=texts[chunk.doc_id][chunk.index])
+            filled.append(chunk)
+        return filled
+
+    def search(self, query, k=5):
+        """Return up to ``k`` ``(score, chunk)`` pairs, best first."""
+        if not self.live:
+            return []
+        n = self.live
+        avgdl = self._total_length / n or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / avgdl)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        chunks = self._with_text([self.chunks[chunk_id] for chunk_id, _ in best])
+        return [(score, chunk) for (_, score), chunk in zip(best, chunks)]
+
+    def select(self, query, token_budget, k=5):
+        """Top-k chunks for ``query`` that fit in ``token_budget``, in document order."""
+        picked = []
+        used = 0
+        for _, chunk in self.search(query, k):
+            if used + chunk.tokens > token_budget:
+                continue
+            picked.append(chunk)
+            used += chunk.tokens
+        return sorted(picked, key=lambda c: (c.doc_id, c.index))
+
+    def leading_chunks(self, doc_id, token_budget):
+        """The opening chunks of a document that fit in ``token_budget``."""
+        picked = []
+        used = 0
+        for chunk_id in self.docs.get(doc_id, []):
+            chunk = self.chunks[chunk_id]
+            if used + chunk.tokens > token_budget:
+                break
+            picked.append(chunk)
+            used += chunk.tokens
+        return self._with_text(picked)
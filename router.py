@@ -0,0 +1,344 @@
+"""Latency-aware routing between model backends with failover.
+
+Each backend exposes ``name``, ``local``, ``cost``, ``ping()`` and
+``stream(messages, state, meta)``, which returns an iterator of text deltas.
+``Router`` keeps per-backend health (time to first chunk, error rate,
+cool-down after failures), orders backends by a policy and fails over to the
+next one when a backend errors, or when its first chunk misses the deadline and
+another backend is up (with nowhere to go, the slow backend is waited for). A
+``CancelToken`` passed to ``stream`` ends the answer between chunks and closes
+the backend's stream.
+``StubBackend`` stands in for a real model in tests and benchmarks.
+"""
+import os
+import queue
+import threading
+import time
+
+from backends import OLLAMA_KEEP_ALIVE, GeminiChatHandle
+
+POLICIES = ("prefer-local", "fastest", "cost")
+DEFAULT_POLICY = os.getenv("DEBAI_ROUTING_POLICY", "prefer-local")
+# How long to wait for a backend's first chunk before failing over to the next one
+FIRST_CHUNK_TIMEOUT = float(os.getenv("DEBAI_FIRST_CHUNK_TIMEOUT", "30"))
+
+_DONE = object()
+_CANCELLED = object()
+
+
+class NoBackendAvailable(Exception):
+    def __init__(self, failures):
+        self.failures = failures
+        detail = "; ".join(f"{name}: {reason}" for name, reason in failures) or "no backends configured"
+        super().__init__(f"No model backend available ({detail})")
+
+
+class FirstChunkTimeout(Exception):
+    pass
+
+
+class OllamaBackend:
+    local = True
+    cost = 0.0
+
+    def __init__(self, registry, model, keep_alive=OLLAMA_KEEP_ALIVE):
+        self.registry = registry
+        self.model = model
+        self.keep_alive = keep_alive
+        self.name = f"ollama:{model}"
+
+    def ping(self):
+        self.registry.ollama_probe().ps()
+
+    def stream(self, messages, state, meta):
+        chunks = self.registry.ollama().chat(
+            model=self.model, stream=True, messages=messages, keep_alive=self.keep_alive
+        )
+        return self._deltas(chunks, meta)
+
+    def _deltas(self, chunks, meta):
+        try:
+            for chunk in chunks:
+                if chunk.get("done"):
+                    # Ollama reports model load time separately from generation time
+                    meta["load_seconds"] = (chunk.get("load_duration") or 0) / 1e9
+                    meta["prompt_eval_seconds"] = (chunk.get("prompt_eval_duration") or 0) / 1e9
+                yield chunk.get("message", {}).get("content", "")
+        finally:
+            # closing the HTTP stream makes Ollama stop generating
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+
+class GeminiBackend:
+    local = False
+    cost = 1.0
+
+    def __init__(self, registry, model, api_key_env="GEMINI_API_KEY"):
+        self.registry = registry
+        self.model = model
+        self.api_key_env = api_key_env
+        self.name = f"gemini:{model}"
+
+    def ping(self):
+        if not os.getenv(self.api_key_env):
+            raise RuntimeError(f"API key not set ({self.api_key_env})")
+
+    def stream(self, messages, state, meta):
+        api_key = os.getenv(self.api_key_env)
+        if not api_key:
+            raise RuntimeError(f"API key not set ({self.api_key_env})")
+        # Extract system instruction if present
+        system_instruction = None
+        history = []
+        for m in messages[:-1]: # Exclude last message which is the prompt
+            if m["role"] == "system":
+                # the system prompt may be followed by a summary of older turns
+                if system_instruction:
+                    system_instruction += "\n\n" + m["content"]
+                else:
+                    system_instruction = m["content"]
+                continue
+            role = "user" if m["role"] == "user" else "model"
+            history.append({"role": role, "parts": [m["content"]]})
+        model = self.registry.gemini_model(api_key, self.model, system_instruction)
+        # The session's chat object is reused while it already holds this history
+        handle = state.setdefault("gemini_chat", GeminiChatHandle())
+        return handle.stream(model, self.model, system_instruction, history, messages[-1]["content"])
+
+
+class StubBackend:
+    """Deterministic fake backend: fixed reply, configurable latency and failures."""
+
+    def __init__(self, name, reply="Hello from the stub backend.", first_chunk_delay=0.0,
+                 chunk_delay=0.0, fail=None, local=True, cost=0.0):
+        self.name = name
+        self.reply = reply
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.fail = fail  # None, "ping", "connect" or "midstream"
+        self.local = local
+        self.cost = cost
+        self.calls = 0
+
+    def ping(self):
+        if self.fail == "ping":
+            raise ConnectionError(f"{self.name} is down")
+
+    def stream(self, messages, state, meta):
+        self.calls += 1
+        return self._words()
+
+    def _words(self):
+        if self.fail == "connect":
+            raise ConnectionError(f"{self.name} refused the connection")
+        time.sleep(self.first_chunk_delay)
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            if self.fail == "midstream" and i == len(words) // 2:
+                raise ConnectionError(f"{self.name} dropped the stream")
+            yield word if i == 0 else " " + word
+            time.sleep(self.chunk_delay)
+
+
+class BackendHealth:
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.ttft = None  # exponentially weighted moving average, seconds
+        self.last_error = None
+        self.down_until = 0.0
+
+    @property
+    def error_rate(self):
+        return self.errors / self.requests if self.requests else 0.0
+
+    def record_success(self, ttft):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.ttft = ttft if self.ttft is None else self.alpha * ttft + (1 - self.alpha) * self.ttft
+
+    def record_failure(self, error, cooldown):
+        self.requests += 1
+        self.errors += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        # back off longer while a backend keeps failing
+        self.down_until = time.monotonic() + cooldown * min(self.consecutive_failures, 8)
+
+    def is_up(self):
+        return time.monotonic() >= self.down_until
+
+
+def _pump(iterator, out, stop, cancel=None):
+    # Reads a backend stream on a worker thread so the caller can time out on it
+    try:
+        for chunk in iterator:
+            if stop.is_set() or (cancel is not None and cancel.cancelled):
+                break
+            out.put(chunk)
+    except BaseException as e:
+        out.put(e)
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+        out.put(_DONE)
+
+
+def _get(out, timeout=None, cancel=None, poll=0.1):
+    # queue.get that gives up with _CANCELLED as soon as the token is cancelled and
+    # calls its heartbeat on every poll
+    if cancel is None:
+        return out.get(timeout=timeout)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not cancel.cancelled:
+        wait = poll if deadline is None else min(poll, deadline - time.monotonic())
+        if wait <= 0:
+            raise queue.Empty
+        try:
+            return out.get(timeout=wait)
+        except queue.Empty:
+            cancel.beat()
+    return _CANCELLED
+
+
+class Router:
+    """Process-wide router; share one instance across sessions (``st.cache_resource``)."""
+
+    def __init__(self, backends, first_chunk_timeout=FIRST_CHUNK_TIMEOUT, cooldown=15.0, ping_ttl=10.0):
+        self.backends = list(backends)
+        self.first_chunk_timeout = first_chunk_timeout
+        self.cooldown = cooldown
+        self.ping_ttl = ping_ttl
+        self.health = {b.name: BackendHealth() for b in self.backends}
+        self._pinged = {}
+        self._lock = threading.Lock()
+
+    def _check(self, backend):
+        # Cheap health probe, at most once per ping_ttl per backend
+        now = time.monotonic()
+        with self._lock:
+            last = self._pinged.get(backend.name)
+            if last is not None and now - last[0] < self.ping_ttl:
+                return last[1]
+        try:
+            backend.ping()
+            reason = None
+        except Exception as e:
+            reason = str(e)
+        with self._lock:
+            self._pinged[backend.name] = (now, reason)
+        return reason
+
+    def order(self, policy=DEFAULT_POLICY):
+        if policy == "fastest":
+            # untried backends sort first so they get measured
+            key = lambda b: self.health[b.name].ttft or 0.0
+        elif policy == "cost":
+            key = lambda b: b.cost
+        else:
+            key = lambda b: not b.local
+        ranked = sorted(self.backends, key=key)
+        # backends in cool-down go last rather than being dropped
+        return sorted(ranked, key=lambda b: not self.health[b.name].is_up())
+
+    def stream(self, messages, state, policy=DEFAULT_POLICY, meta=None, cancel=None):
+        """Yield text deltas from the first backend that answers in time.
+
+        ``meta`` (a dict) receives the chosen backend name, time to first chunk and
+        any backend-reported timings; ``meta["cancelled"]`` is set if ``cancel``
+        ended the answer early. Raises ``NoBackendAvailable`` if every backend
+        fails before producing output.
+        """
+        meta = {} if meta is None else meta
+        failures = []
+        ordered = self.order(policy)
+        for position, backend in enumerate(ordered):
+            health = self.health[backend.name]
+            reason = self._check(backend)
+            if reason is not None:
+                failures.append((backend.name, reason))
+                continue
+            start = time.perf_counter()
+            out = queue.Queue()
+            stop = threading.Event()
+            try:
+                iterator = backend.stream(messages, state, meta)
+                threading.Thread(
+                    target=_pump, args=(iterator, out, stop, cancel), name=f"debai-{backend.name}", daemon=True
+                ).start()
+                try:
+                    first = _get(out, self.first_chunk_timeout, cancel)
+                except queue.Empty:
+                    if any(self._check(b) is None for b in ordered[position + 1:]):
+                        raise
+                    # nothing healthy to fail over to: a slow answer (cold model load, long
+                    # prompt on CPU) beats none, so keep reading this stream
+                    first = _get(out, cancel=cancel)
+            except queue.Empty:
+                stop.set()
+                error = FirstChunkTimeout(f"no output within {self.first_chunk_timeout:g}s")
+                health.record_failure(error, self.cooldown)
+                failures.append((backend.name, str(error)))
+                continue
+            except Exception as e:
+                health.record_failure(e, self.cooldown)
+                failures.append((backend.name, str(e)))
+                continue
+            except BaseException:
+                # the caller's run was stopped while waiting (e.g. raised by the heartbeat)
+                stop.set()
+                raise
+            if first is _CANCELLED:
+                stop.set()
+                meta["backend"] = backend.name
+                meta["cancelled"] = True
+                return
+            if isinstance(first, BaseException):
+                health.record_failure(first, self.cooldown)
+                failures.append((backend.name, str(first)))
+                continue
+
+            ttft = time.perf_counter() - start
+            meta["backend"] = backend.name
+            meta["ttft_seconds"] = ttft
+            if first is _DONE:
+                health.record_success(ttft)
+                return
+            try:
+                yield first
+                while True:
+                    item = _get(out, cancel=cancel)
+                    if item is _CANCELLED:
+                        meta["cancelled"] = True
+                        break
+                    if item is _DONE:
+                        break
+                    if isinstance(item, BaseException):
+                        # output was already shown, so this turn can't move to another backend
+                        health.record_failure(item, self.cooldown)
+                        raise item
+                    yield item
+            finally:
+                stop.set()
+            health.record_success(ttft)
+            return
+        raise NoBackendAvailable(failures)
+
+    def snapshot(self):
+        rows = []
+        for b in self.backends:
+            h = self.health[b.name]
+            rows.append({
+                "backend": b.name,
+                "up": h.is_up(),
+                "requests": h.requests,
+                "error rate": round(h.error_rate, 2),
+                "ttft (s)": round(h.ttft, 2) if h.ttft is not None else None,
+                "last error": h.last_error,
+            })
+        return rows
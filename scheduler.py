@@ -0,0 +1,144 @@
+"""Process-wide limit on concurrent model calls.
+
+Every Streamlit session runs in its own script thread; without a limit, N users
+means N model streams competing for the same CPU. ``RequestScheduler`` hands
+out at most ``max_concurrent`` slots. Waiting requests are queued FIFO, or with
+``fair=True`` the next slot goes to the session with the fewest active requests
+that was served least recently, so one busy session can't starve the others.
+"""
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from streaming import GenerationCancelled
+
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("DEBAI_MAX_CONCURRENT_GENERATIONS", "2"))
+
+
+class Ticket:
+    def __init__(self, ticket_id, session_id):
+        self.id = ticket_id
+        self.session_id = session_id
+        self.enqueued_at = time.perf_counter()
+        self.granted_at = None
+        self.released = False
+
+    @property
+    def wait_seconds(self):
+        end = self.granted_at if self.granted_at is not None else time.perf_counter()
+        return end - self.enqueued_at
+
+
+class RequestScheduler:
+    def __init__(self, max_concurrent=MAX_CONCURRENT_GENERATIONS, fair=True):
+        self.max_concurrent = max(1, max_concurrent)
+        self.fair = fair
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._waiting = []
+        self._active = {}  # ticket id -> ticket
+        self._grants = itertools.count(1)
+        self._last_served = {}  # session id -> grant number
+        self.completed = 0
+        self.total_wait = 0.0
+
+    def _active_for(self, session_id):
+        return sum(1 for t in self._active.values() if t.session_id == session_id)
+
+    def _fair_key(self, ticket):
+        # fewest active requests, then least recently served session, then arrival order
+        return (
+            self._active_for(ticket.session_id),
+            self._last_served.get(ticket.session_id, 0),
+            ticket.id,
+        )
+
+    def _next_waiting(self):
+        if not self.fair:
+            return self._waiting[0]
+        return min(self._waiting, key=self._fair_key)
+
+    def _dispatch(self):
+        granted = False
+        while self._waiting and len(self._active) < self.max_concurrent:
+            ticket = self._next_waiting()
+            self._waiting.remove(ticket)
+            ticket.granted_at = time.perf_counter()
+            self._active[ticket.id] = ticket
+            self._last_served[ticket.session_id] = next(self._grants)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _position(self, ticket):
+        # 1-based place in line, following the same order _dispatch would grant in
+        if not self.fair:
+            return self._waiting.index(ticket) + 1
+        order = sorted(self._waiting, key=self._fair_key)
+        return order.index(ticket) + 1
+
+    def acquire(self, session_id, on_wait=None, poll=0.25, cancel=None):
+        """Block until a slot is free. ``on_wait(position)`` is called while queued.
+
+        Raises ``GenerationCancelled`` if ``cancel`` is cancelled before a slot is
+        granted; ``cancel.beat()`` is called on every poll while queued.
+        """
+        with self._cond:
+            ticket = Ticket(next(self._ids), session_id)
+            self._waiting.append(ticket)
+            self._dispatch()
+        shown = None
+        try:
+            while True:
+                with self._cond:
+                    if ticket.granted_at is not None:
+                        break
+                    if cancel is not None and cancel.cancelled:
+                        raise GenerationCancelled(cancel.reason)
+                    position = self._position(ticket)
+                    if position == shown:
+                        self._cond.wait(poll)
+                if cancel is not None:
+                    # outside the lock: the heartbeat may raise to end the caller's run
+                    cancel.beat()
+                if position != shown:
+                    shown = position
+                    if on_wait is not None:
+                        on_wait(position)
+        except BaseException:
+            # e.g. Streamlit stopped the script while we were queued
+            self.release(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket):
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+            elif self._active.pop(ticket.id, None) is not None:
+                self.completed += 1
+                self.total_wait += ticket.wait_seconds
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, session_id, on_wait=None, cancel=None):
+        ticket = self.acquire(session_id, on_wait=on_wait, cancel=cancel)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": len(self._active),
+                "queued": len(self._waiting),
+                "max_concurrent": self.max_concurrent,
+                "completed": self.completed,
+                "avg_wait_seconds": self.total_wait / self.completed if self.completed else 0.0,
+            }
@@ -0,0 +1,146 @@
+"""Disk-backed storage for the large texts of chat sessions.
+
+Messages in ``st.session_state`` keep their role, flags and a short preview;
+text longer than ``INLINE_CHARS`` (OCR results, long answers) is moved into a
+``BlobStore`` and the message only keeps its ``ref``. Blobs are stored once by
+content hash in SQLite, so a document uploaded in twenty sessions is stored
+once, and served from an LRU hot cache bounded in bytes. The texts of sessions
+nobody is looking at fall out of the hot cache and are read back from disk when
+the session becomes active again, so RAM no longer grows with every open tab.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from history_view import preview
+from lru import ByteLRU
+
+INLINE_CHARS = int(os.getenv("DEBAI_SESSION_INLINE_CHARS", "4000"))
+HOT_CACHE_MB = int(os.getenv("DEBAI_SESSION_CACHE_MB", "64"))
+# Blobs no session has read or written for this long are deleted at start-up
+BLOB_TTL_DAYS = float(os.getenv("DEBAI_SESSION_BLOB_TTL_DAYS", "7"))
+
+_MB = 1024 * 1024
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BlobStore:
+    """Content-addressed texts: in-memory LRU (bounded in bytes) in front of SQLite."""
+
+    def __init__(self, path=None, max_bytes=HOT_CACHE_MB * _MB):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.disk_reads = 0
+        self.writes = 0
+        self.duplicates = 0
+        self._hot = ByteLRU(max_bytes)  # ref -> text
+        # puts of each ref in this process not released yet; a blob several
+        # sessions or documents share survives until the last one lets go
+        self._holders = Counter()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS blobs "
+                "(ref TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, used_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def put(self, text):
+        """Store ``text`` (if it isn't already) and return its ref."""
+        ref = text_hash(text)
+        with self._lock:
+            if self._db is not None:
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO blobs (ref, text, size, used_at) VALUES (?, ?, ?, ?)",
+                    (ref, text, len(text), time.time()),
+                )
+                if cursor.rowcount:
+                    self.writes += 1
+                else:
+                    self.duplicates += 1
+                    self._db.execute("UPDATE blobs SET used_at = ? WHERE ref = ?", (time.time(), ref))
+                self._db.commit()
+            self._holders[ref] += 1
+            self._hot.put(ref, text, len(text))
+        return ref
+
+    def get(self, ref):
+        with self._lock:
+            text = self._hot.get(ref)
+            if text is not None:
+                self.hits += 1
+                return text
+            if self._db is None:
+                raise KeyError(ref)
+            row = self._db.execute("SELECT text FROM blobs WHERE ref = ?", (ref,)).fetchone()
+            if row is None:
+                raise KeyError(ref)
+            self._db.execute("UPDATE blobs SET used_at = ? WHERE ref = ?", (time.time(), ref))
+            self._db.commit()
+            self.disk_reads += 1
+            self._hot.put(ref, row[0], len(row[0]))
+            return row[0]
+
+    def release(self, ref):
+        """Undo one ``put`` of a short-lived text; the blob is deleted once nothing holds it."""
+        with self._lock:
+            self._holders[ref] -= 1
+            if self._holders[ref] > 0:
+                return False
+            del self._holders[ref]
+            self._hot.pop(ref)
+            if self._db is not None:
+                self._db.execute("DELETE FROM blobs WHERE ref = ?", (ref,))
+                self._db.commit()
+            return True
+
+    def prune(self, max_age_days=BLOB_TTL_DAYS):
+        """Delete blobs unused for ``max_age_days``; returns how many were removed."""
+        if self._db is None:
+            return 0
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM blobs WHERE used_at < ?", (time.time() - max_age_days * 86400,))
+            self._db.commit()
+            return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            disk_items, disk_bytes = 0, 0
+            if self._db is not None:
+                disk_items, disk_bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            return {
+                "hot_items": len(self._hot),
+                "hot_mb": self._hot.bytes / _MB,
+                "disk_items": disk_items,
+                "disk_mb": disk_bytes / _MB,
+                "hits": self.hits,
+                "disk_reads": self.disk_reads,
+                "duplicates": self.duplicates,
+            }
+
+
+def compact(message, store, inline_chars=INLINE_CHARS):
+    """Move a long ``content`` into ``store``; the message keeps ``ref``, ``chars`` and its preview."""
+    content = message.get("content")
+    if content is None or len(content) <= inline_chars:
+        return message
+    message["preview"] = preview(content)
+    message["chars"] = len(content)
+    message["ref"] = store.put(content)
+    del message["content"]
+    return message
+
+
+def message_text(message, store):
+    if "content" in message:
+        return message["content"]
+    return store.get(message["ref"])
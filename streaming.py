@@ -0,0 +1,130 @@
+"""Throttled rendering of streamed model output.
+
+Chunks are buffered in a list and the accumulated text is only joined and
+pushed to the UI every ``interval`` seconds or ``max_chars`` characters,
+instead of re-rendering the whole answer on every token. A ``CancelToken``
+stops a stream between chunks; the stream is closed so the model stops too,
+and ``GenerationCancelled`` tells the caller the answer is partial.
+"""
+import threading
+import time
+
+from retrieval import estimate_tokens
+
+
+class GenerationCancelled(Exception):
+    """A ``CancelToken`` stopped the generation (while queued or mid-stream)."""
+
+
+class CancelToken:
+    """Thread-safe flag checked between chunks (and while queued for a model slot).
+
+    ``heartbeat`` is called on every poll of those wait loops, on the waiting
+    thread. Streamlit only stops a script run at an ``st.*`` call, so the app
+    passes a function that touches the page; otherwise a click on Stop would not
+    be seen until the wait ends.
+    """
+
+    def __init__(self, heartbeat=None):
+        self._event = threading.Event()
+        self.reason = None
+        self.heartbeat = heartbeat
+
+    def cancel(self, reason="stopped"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def beat(self):
+        if self.heartbeat is not None:
+            self.heartbeat()
+
+
+class StreamRenderer:
+    def __init__(self, render, interval=0.05, max_chars=200, clock=time.perf_counter):
+        self.render = render
+        self.interval = interval
+        self.max_chars = max_chars
+        self.clock = clock
+        self.parts = []
+        self.chunks = 0
+        self.flushes = 0
+        self.render_seconds = 0.0
+        self._pending_chars = 0
+        self._started = clock()
+        self._first_chunk = None
+        self._last_chunk = None
+        self._last_flush = self._started
+        self._text = ""
+        self._joined_parts = 0
+
+    @property
+    def text(self):
+        # join lazily; only the flushes and the final result need the whole string
+        if self._joined_parts != len(self.parts):
+            self._text = "".join(self.parts)
+            self._joined_parts = len(self.parts)
+        return self._text
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        now = self.clock()
+        if self._first_chunk is None:
+            self._first_chunk = now
+        self._last_chunk = now
+        self.parts.append(chunk)
+        self.chunks += 1
+        self._pending_chars += len(chunk)
+        if self._pending_chars >= self.max_chars or now - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        start = self.clock()
+        self.render(self.text)
+        self._last_flush = self.clock()
+        self.render_seconds += self._last_flush - start
+        self._pending_chars = 0
+        self.flushes += 1
+
+    def consume(self, stream, cancel=None):
+        """Feed every chunk of ``stream``, do a final flush and return the full text.
+
+        Once ``cancel`` is cancelled it stops, flushes what arrived and raises
+        ``GenerationCancelled``; ``text`` still holds the partial answer.
+        ``stream`` is closed either way, also when rendering raises (e.g.
+        Streamlit interrupting the script).
+        """
+        try:
+            for chunk in stream:
+                self.feed(chunk)
+                if cancel is not None and cancel.cancelled:
+                    break
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        self.flush()
+        if cancel is not None and cancel.cancelled:
+            raise GenerationCancelled(cancel.reason)
+        return self.text
+
+    def stats(self):
+        text = self.text
+        tokens = estimate_tokens(text)
+        first = self._first_chunk
+        streaming = (self._last_chunk - first) if first is not None else 0.0
+        return {
+            "chars": len(text),
+            "chunks": self.chunks,
+            "tokens": tokens,
+            "flushes": self.flushes,
+            "first_chunk_seconds": (first - self._started) if first is not None else None,
+            "stream_seconds": streaming,
+            "render_seconds": self.render_seconds,
+            "tokens_per_sec": tokens / streaming if streaming > 0 else 0.0,
+        }
@@ -0,0 +1,150 @@
+import threading
+
+import pytest
+
+from router import NoBackendAvailable, Router, StubBackend
+from streaming import CancelToken
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def run(router, **kwargs):
+    meta = {}
+    text = "".join(router.stream(MESSAGES, {}, meta=meta, **kwargs))
+    return text, meta
+
+
+def test_streams_from_first_backend():
+    router = Router([StubBackend("local", reply="one two three")])
+    text, meta = run(router)
+    assert text == "one two three"
+    assert meta["backend"] == "local"
+    assert router.health["local"].requests == 1
+
+
+def test_fails_over_when_first_chunk_is_late():
+    slow = StubBackend("slow", first_chunk_delay=1.0)
+    fast = StubBackend("fast", reply="fast answer", local=False)
+    router = Router([slow, fast], first_chunk_timeout=0.1)
+    text, meta = run(router)
+    assert text == "fast answer"
+    assert meta["backend"] == "fast"
+    assert router.health["slow"].errors == 1
+    assert router.health["slow"].last_error == "no output within 0.1s"
+
+
+def test_slow_first_chunk_is_waited_for_without_a_fallback():
+    router = Router([StubBackend("slow", reply="late answer", first_chunk_delay=0.3)], first_chunk_timeout=0.05)
+    text, meta = run(router)
+    assert text == "late answer"
+    assert router.health["slow"].errors == 0
+
+
+def test_slow_first_chunk_is_waited_for_when_fallback_is_down():
+    slow = StubBackend("slow", reply="late answer", first_chunk_delay=0.3)
+    down = StubBackend("down", fail="ping", local=False)
+    router = Router([slow, down], first_chunk_timeout=0.05)
+    assert run(router)[0] == "late answer"
+    assert down.calls == 0
+
+
+def test_fails_over_on_connect_error():
+    router = Router([StubBackend("down", fail="connect"), StubBackend("up", reply="ok", local=False)])
+    text, meta = run(router)
+    assert text == "ok"
+    assert meta["backend"] == "up"
+    assert not router.health["down"].is_up()
+
+
+def test_failed_ping_skips_backend_without_calling_it():
+    down = StubBackend("down", fail="ping")
+    router = Router([down, StubBackend("up", reply="ok", local=False)])
+    assert run(router)[0] == "ok"
+    assert down.calls == 0
+
+
+def test_midstream_error_is_raised_not_failed_over():
+    broken = StubBackend("broken", reply="a b c d", fail="midstream")
+    other = StubBackend("other", local=False)
+    router = Router([broken, other])
+    received = []
+    with pytest.raises(ConnectionError):
+        for delta in router.stream(MESSAGES, {}):
+            received.append(delta)
+    # the first half was already shown, so the turn stays with this backend
+    assert "".join(received) == "a b"
+    assert other.calls == 0
+    assert router.health["broken"].errors == 1
+
+
+def test_no_backend_available_lists_every_failure():
+    router = Router([StubBackend("a", fail="connect"), StubBackend("b", fail="ping")])
+    with pytest.raises(NoBackendAvailable) as info:
+        run(router)
+    assert [name for name, _ in info.value.failures] == ["a", "b"]
+
+
+def test_policy_ordering():
+    local = StubBackend("local", local=True, cost=0.0)
+    cheap = StubBackend("cheap", local=False, cost=1.0)
+    pricey = StubBackend("pricey", local=False, cost=5.0)
+    router = Router([pricey, cheap, local])
+    assert [b.name for b in router.order("prefer-local")][0] == "local"
+    assert [b.name for b in router.order("cost")] == ["local", "cheap", "pricey"]
+    router.health["local"].record_success(2.0)
+    router.health["cheap"].record_success(0.5)
+    router.health["pricey"].record_success(1.0)
+    assert [b.name for b in router.order("fastest")] == ["cheap", "pricey", "local"]
+
+
+def test_backend_in_cooldown_is_tried_last():
+    flaky = StubBackend("flaky", fail="connect")
+    cloud = StubBackend("cloud", reply="ok", local=False)
+    router = Router([flaky, cloud], cooldown=60.0)
+    run(router)
+    flaky.fail = None
+    assert [b.name for b in router.order("prefer-local")] == ["cloud", "flaky"]
+    # after the cool-down it is preferred again
+    router.health["flaky"].down_until = 0.0
+    assert [b.name for b in router.order("prefer-local")] == ["flaky", "cloud"]
+
+
+def test_cancel_mid_stream_keeps_partial_answer():
+    backend = StubBackend("local", reply=" ".join(["word"] * 50), chunk_delay=0.01)
+    router = Router([backend])
+    token = CancelToken()
+    meta = {}
+    received = []
+    for delta in router.stream(MESSAGES, {}, meta=meta, cancel=token):
+        received.append(delta)
+        if len(received) == 3:
+            token.cancel()
+    assert meta["cancelled"]
+    assert 3 <= len(received) < 50
+
+
+def test_cancel_while_waiting_for_first_chunk():
+    router = Router([StubBackend("slow", first_chunk_delay=2.0)], first_chunk_timeout=30.0)
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    text, meta = run(router, cancel=token)
+    assert text == ""
+    assert meta["cancelled"]
+    # cancelling is not a backend failure
+    assert router.health["slow"].errors == 0
+
+
+def test_heartbeat_is_called_while_waiting():
+    beats = []
+
+    class Interrupted(BaseException):
+        pass
+
+    def heartbeat():
+        beats.append(1)
+        if len(beats) == 3:
+            raise Interrupted()
+
+    router = Router([StubBackend("slow", first_chunk_delay=2.0)], first_chunk_timeout=30.0)
+    with pytest.raises(Interrupted):
+        run(router, cancel=CancelToken(heartbeat=heartbeat))
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import RequestScheduler
+from streaming import CancelToken, GenerationCancelled
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def queue_up(scheduler, session_id, granted, **kwargs):
+    # acquire on a thread; records the session when its slot is granted
+    def run():
+        ticket = scheduler.acquire(session_id, poll=0.01, **kwargs)
+        granted.append(session_id)
+        scheduler.release(ticket)
+
+    queued = scheduler.stats()["queued"]
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    wait_for(lambda: scheduler.stats()["queued"] > queued)
+    return thread
+
+
+def test_limits_concurrent_slots():
+    scheduler = RequestScheduler(max_concurrent=2)
+    first = scheduler.acquire("a")
+    second = scheduler.acquire("b")
+    assert scheduler.stats()["active"] == 2
+    granted = []
+    thread = queue_up(scheduler, "c", granted)
+    assert granted == []
+    scheduler.release(first)
+    thread.join(2)
+    assert granted == ["c"]
+    scheduler.release(second)
+    assert scheduler.stats()["active"] == 0
+    assert scheduler.stats()["completed"] == 3
+
+
+def test_fifo_order_without_fairness():
+    scheduler = RequestScheduler(max_concurrent=1, fair=False)
+    held = scheduler.acquire("busy")
+    granted = []
+    threads = [queue_up(scheduler, s, granted) for s in ("busy", "busy", "other")]
+    scheduler.release(held)
+    for t in threads:
+        t.join(2)
+    assert granted == ["busy", "busy", "other"]
+
+
+def test_fair_order_serves_least_recently_served_session_first():
+    scheduler = RequestScheduler(max_concurrent=1, fair=True)
+    held = scheduler.acquire("busy")
+    granted = []
+    threads = [queue_up(scheduler, s, granted) for s in ("busy", "busy", "other")]
+    scheduler.release(held)
+    for t in threads:
+        t.join(2)
+    # "other" has never been served, so it goes ahead of the busy session's backlog
+    assert granted == ["other", "busy", "busy"]
+
+
+def test_on_wait_reports_queue_position():
+    scheduler = RequestScheduler(max_concurrent=1)
+    held = scheduler.acquire("a")
+    positions = []
+    granted = []
+    thread = queue_up(scheduler, "b", granted, on_wait=positions.append)
+    scheduler.release(held)
+    thread.join(2)
+    assert positions == [1]
+    assert granted == ["b"]
+
+
+def test_cancel_while_queued_gives_up_the_place_in_line():
+    scheduler = RequestScheduler(max_concurrent=1)
+    held = scheduler.acquire("a")
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel).start()
+    with pytest.raises(GenerationCancelled):
+        scheduler.acquire("b", cancel=token, poll=0.01)
+    assert scheduler.stats()["queued"] == 0
+    scheduler.release(held)
+    assert scheduler.stats()["active"] == 0
+
+
+def test_interrupted_wait_releases_ticket():
+    # e.g. Streamlit stopping the script from the heartbeat while queued
+    class Interrupted(BaseException):
+        pass
+
+    def heartbeat():
+        raise Interrupted()
+
+    scheduler = RequestScheduler(max_concurrent=1)
+    held = scheduler.acquire("a")
+    with pytest.raises(Interrupted):
+        scheduler.acquire("b", cancel=CancelToken(heartbeat=heartbeat), poll=0.01)
+    assert scheduler.stats()["queued"] == 0
+    scheduler.release(held)
+    # the slot is free again for the next request
+    assert scheduler.acquire("c").granted_at is not None
+
+
+def test_slot_releases_on_error():
+    scheduler = RequestScheduler(max_concurrent=1)
+    with pytest.raises(RuntimeError):
+        with scheduler.slot("a"):
+            raise RuntimeError("stream failed")
+    assert scheduler.stats()["active"] == 0
+
+
+def test_release_is_idempotent():
+    scheduler = RequestScheduler(max_concurrent=1)
+    ticket = scheduler.acquire("a")
+    scheduler.release(ticket)
+    scheduler.release(ticket)
+    assert scheduler.stats()["completed"] == 1
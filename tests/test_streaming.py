@@ -0,0 +1,42 @@
+import pytest
+
+from streaming import CancelToken, GenerationCancelled, StreamRenderer
+
+
+def test_consume_returns_full_text_and_closes_stream():
+    rendered = []
+    closed = []
+
+    def stream():
+        try:
+            yield "Hello, "
+            yield "world"
+        finally:
+            closed.append(True)
+
+    renderer = StreamRenderer(rendered.append, interval=60, max_chars=1000)
+    assert renderer.consume(stream(), cancel=CancelToken()) == "Hello, world"
+    assert rendered[-1] == "Hello, world"
+    assert closed == [True]
+
+
+def test_cancel_mid_stream_raises_and_keeps_partial_text():
+    token = CancelToken()
+    closed = []
+
+    def stream():
+        try:
+            yield "partial "
+            token.cancel("stopped")
+            yield "answer"
+            yield "never sent"
+        finally:
+            closed.append(True)
+
+    rendered = []
+    renderer = StreamRenderer(rendered.append, interval=60, max_chars=1000)
+    with pytest.raises(GenerationCancelled):
+        renderer.consume(stream(), cancel=token)
+    assert renderer.text == "partial answer"
+    assert rendered[-1] == "partial answer"
+    assert closed == [True]
@@ -0,0 +1,346 @@
+"""Page CSS for the dark and light themes.
+
+Rendered once per process, when the module is first imported; a Streamlit rerun
+only looks the finished stylesheet up instead of rebuilding it.
+"""
+
+# 🌑 DARK MODE — “FOCUSED · FUTURISTIC · CINEMATIC”
+_DARK_BG_IMAGE = """
+    radial-gradient(circle at 15% 50%, rgba(79, 70, 229, 0.15), transparent 40%),
+    radial-gradient(circle at 85% 30%, rgba(59, 130, 246, 0.15), transparent 40%),
+    linear-gradient(180deg, #020617 0%, #0f172a 50%, #1e293b 100%)
+"""
+
+DARK_CSS_VARS = f"""
+--bg-color: #020617;
+--card-bg: rgba(255, 255, 255, 0.08);
+--chat-bg: rgba(255, 255, 255, 0.08);
+--chat-user-bg: rgba(59, 130, 246, 0.15);
+--chat-assistant-bg: rgba(255, 255, 255, 0.05);
+--accent: #60a5fa;
+--accent-glow: rgba(96, 165, 250, 0.4);
+--text-primary: #f1f5f9;
+--text-secondary: #94a3b8;
+--border-color: rgba(255, 255, 255, 0.1);
+--sidebar-bg: #020617;
+--app-bg: {_DARK_BG_IMAGE};
+--glass-blur: 25px;
+--card-shadow: 0 8px 32px 0 rgba(0, 0, 0, 0.3);
+--logo-bg: rgba(59, 130, 246, 0.15);
+--logo-border: rgba(59, 130, 246, 0.3);
+--bg-anim: orbFloat 40s ease-in-out infinite alternate;
+"""
+
+# 🌕 LIGHT MODE — “CLEAN · AIRY · APPLE-LEVEL POLISH”
+_LIGHT_BG_IMAGE = """
+    radial-gradient(circle at 0% 0%, rgba(219, 234, 254, 0.6), transparent 50%),
+    radial-gradient(circle at 100% 100%, rgba(237, 233, 254, 0.6), transparent 50%),
+    linear-gradient(180deg, #ffffff 0%, #f8fafc 100%)
+"""
+
+LIGHT_CSS_VARS = f"""
+--bg-color: #ffffff;
+--card-bg: rgba(255, 255, 255, 0.65);
+--chat-bg: rgba(255, 255, 255, 0.65);
+--chat-user-bg: rgba(59, 130, 246, 0.08);
+--chat-assistant-bg: rgba(255, 255, 255, 0.5);
+--accent: #2563eb;
+--accent-glow: rgba(37, 99, 235, 0.15);
+--text-primary: #0f172a;
+--text-secondary: #475569;
+--border-color: rgba(203, 213, 225, 0.6);
+--sidebar-bg: rgba(255, 255, 255, 0.85);
+--app-bg: {_LIGHT_BG_IMAGE};
+--glass-blur: 20px;
+--card-shadow: 0 10px 40px -10px rgba(0, 0, 0, 0.08);
+--logo-bg: rgba(37, 99, 235, 0.05);
+--logo-border: rgba(37, 130, 235, 0.1);
+--bg-anim: orbFloat 60s ease-in-out infinite alternate;
+"""
+
+
+def _page_css(css_vars):
+    return f"""
+<style>
+@import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600;800&display=swap');
+
+:root {{
+    {css_vars}
+}}
+
+html, body, .stApp {{
+    font-family: 'Inter', 'Segoe UI', system-ui, -apple-system, Roboto, 'Helvetica Neue', Arial;
+    background-color: var(--bg-color);
+    color: var(--text-primary);
+}}
+
+/* Main Background with Noise */
+.stApp {{
+    background-color: var(--bg-color);
+    background-image: var(--app-bg);
+    background-attachment: fixed;
+    background-size: 120% 120%;
+    animation: var(--bg-anim);
+}}
+
+/* Subtle Noise Overlay */
+.stApp::before {{
+    content: "";
+    position: fixed;
+    top: 0; left: 0; width: 100%; height: 100%;
+    background-image: url("data:image/svg+xml,%3Csvg viewBox='0 0 200 200' xmlns='http://www.w3.org/2000/svg'%3E%3Cfilter id='noiseFilter'%3E%3CfeTurbulence type='fractalNoise' baseFrequency='0.65' numOctaves='3' stitchTiles='stitch'/%3E%3C/filter%3E%3Crect width='100%25' height='100%25' filter='url(%23noiseFilter)' opacity='0.03'/%3E%3C/svg%3E");
+    pointer-events: none;
+    z-index: 0;
+}}
+
+@keyframes orbFloat {{
+    0% {{ background-position: 0% 0%; }}
+    100% {{ background-position: 20% 10%; }}
+}}
+
+/* Loader Animation */
+@keyframes spin {{
+    0% {{ transform: rotate(0deg); }}
+    100% {{ transform: rotate(360deg); }}
+}}
+
+.loader {{
+    border: 3px solid rgba(128, 128, 128, 0.2);
+    border-top: 3px solid var(--accent);
+    border-radius: 50%;
+    width: 24px;
+    height: 24px;
+    animation: spin 1s linear infinite;
+    display: inline-block;
+    box-sizing: border-box;
+}}
+
+.block-container {{
+    padding: 6rem 2rem 4rem 2rem !important;
+    max-width: 1200px;
+    margin: 0 auto;
+    position: relative;
+    z-index: 1;
+}}
+
+/* Text Colors */
+h1, h2, h3, h4, h5, h6, p, span, div, label, .stMarkdown, .stText, .stButton, a {{
+    color: var(--text-primary) !important;
+}}
+
+.debai-subtitle, .stMarkdown p {{
+    color: var(--text-secondary) !important;
+}}
+
+/* Ultimate Glass Card */
+.deb-card {{
+    background: var(--card-bg);
+    backdrop-filter: blur(var(--glass-blur));
+    -webkit-backdrop-filter: blur(var(--glass-blur));
+    border: 1px solid var(--border-color);
+    border-top: 1px solid rgba(255, 255, 255, 0.15);
+    border-radius: 24px;
+    padding: 2rem;
+    box-shadow: var(--card-shadow);
+    margin-bottom: 1.5rem;
+    position: relative;
+    z-index: 1;
+    transition: background 0.5s ease, backdrop-filter 0.5s ease, box-shadow 0.5s ease, border-color 0.5s ease;
+}}
+
+.stTabs {{
+    margin-top: 1rem;
+}}
+
+/* Header */
+.debai-title {{
+    font-size: 2.5rem;
+    font-weight: 800;
+    background: linear-gradient(135deg, var(--accent) 0%, #a78bfa 100%);
+    -webkit-background-clip: text;
+    -webkit-text-fill-color: transparent;
+    margin-bottom: 0.5rem;
+    text-shadow: 0 0 30px var(--accent-glow);
+    transition: all 0.5s ease;
+}}
+
+.debai-subtitle {{
+    margin-top: 0;
+    font-size: 0.95rem;
+    color: var(--text-secondary);
+    margin-bottom: 1.25rem;
+}}
+
+.debai-header {{
+    display:flex;align-items:center;gap:12px;margin-bottom:8px;
+}}
+
+.debai-logo {{
+    width:44px;height:44px;
+    background: var(--logo-bg);
+    border: 1px solid var(--logo-border);
+    box-shadow: 0 0 20px var(--accent-glow);
+    border-radius: 16px;
+    padding: 8px;
+    display:inline-flex;align-items:center;justify-content:center;
+    transition: all 0.5s ease;
+}}
+.debai-logo svg {{
+    width:24px;height:24px;
+    fill: var(--accent);
+    transition: fill 0.5s ease;
+}}
+
+/* Sidebar */
+section[data-testid='stSidebar'] {{
+    background-color: var(--sidebar-bg);
+    border-right: 1px solid var(--border-color);
+    transition: background-color 0.5s ease, border-color 0.5s ease;
+}}
+section[data-testid='stSidebar'] .stMarkdown, 
+section[data-testid='stSidebar'] label,
+section[data-testid='stSidebar'] .stCheckbox,
+section[data-testid='stSidebar'] .css-1l02y0g {{
+    color: var(--text-secondary) !important;
+}}
+section[data-testid='stSidebar'] svg {{
+    fill: var(--text-secondary) !important;
+}}
+
+/* Expander */
+div[data-testid="stExpander"] details summary {{
+    color: var(--text-primary) !important;
+    background-color: var(--card-bg);
+    border: 1px solid var(--border-color);
+    border-radius: 12px;
+    backdrop-filter: blur(10px);
+    transition: all 0.3s ease;
+}}
+div[data-testid="stExpander"] details summary:hover {{
+    color: var(--accent) !important;
+    background-color: rgba(255, 255, 255, 0.1);
+}}
+div[data-testid="stExpander"] details {{
+    border-color: var(--border-color);
+}}
+
+/* Chat Bubbles - Ultimate Glass */
+.stChatMessage {{
+    background: var(--chat-bg);
+    backdrop-filter: blur(var(--glass-blur));
+    -webkit-backdrop-filter: blur(var(--glass-blur));
+    border: 1px solid var(--border-color);
+    border-radius: 20px !important;
+    padding: 1.25rem !important;
+    box-shadow: 0 4px 20px rgba(0, 0, 0, 0.05);
+    font-size: 1rem;
+    margin-bottom: 16px;
+    position: relative;
+    z-index: 1;
+    transition: background 0.5s ease, border-color 0.5s ease, backdrop-filter 0.5s ease;
+}}
+
+.stChatMessage[data-testid="stChatMessage-user"] {{
+    background: var(--chat-user-bg);
+    border: 1px solid var(--accent);
+    color: var(--text-primary);
+}}
+.stChatMessage[data-testid="stChatMessage-assistant"] {{
+    background: var(--chat-assistant-bg);
+    border: 1px solid var(--border-color);
+    color: var(--text-primary);
+}}
+
+/* Buttons & Inputs */
+.stButton button, .stDownloadButton button {{
+    background: linear-gradient(135deg, #3B82F6 0%, #2563EB 100%);
+    color: white !important;
+    border: none;
+    border-radius: 8px;
+    font-weight: 600;
+    transition: all 0.3s ease;
+}}
+.stButton button:hover, .stDownloadButton button:hover {{
+    box-shadow: 0 0 15px var(--accent-glow);
+    transform: translateY(-1px);
+    color: white !important;
+}}
+
+/* Send OCR Button */
+.send-ocr-btn {{
+    display: inline-block;
+    padding: 8px 16px;
+    border-radius: 8px;
+    background: rgba(59, 130, 246, 0.15);
+    color: var(--accent) !important;
+    font-weight: 600;
+    text-decoration: none;
+    border: 1px solid rgba(59, 130, 246, 0.3);
+    transition: all 0.2s;
+}}
+.send-ocr-btn:hover {{
+    background: rgba(59, 130, 246, 0.25);
+    box-shadow: 0 0 10px var(--accent-glow);
+}}
+
+/* Custom Scrollbar */
+::-webkit-scrollbar {{
+    width: 8px;
+    height: 8px;
+}}
+::-webkit-scrollbar-track {{
+    background: transparent;
+}}
+::-webkit-scrollbar-thumb {{
+    background: var(--border-color);
+    border-radius: 4px;
+}}
+::-webkit-scrollbar-thumb:hover {{
+    background: var(--accent);
+}}
+
+/* Text Input & Text Area */
+.stTextInput input, .stTextArea textarea {{
+    background-color: var(--card-bg) !important;
+    color: var(--text-primary) !important;
+    border: 1px solid var(--border-color) !important;
+    border-radius: 12px !important;
+    padding: 12px !important;
+    backdrop-filter: blur(var(--glass-blur));
+    transition: all 0.3s ease;
+}}
+.stTextInput input:focus, .stTextArea textarea:focus {{
+    border-color: var(--accent) !important;
+    box-shadow: 0 0 15px var(--accent-glow) !important;
+}}
+
+/* Small responsive tweaks */
+@media (max-width: 760px) {{
+    .debai-title {{ font-size: 1.6rem; }}
+    .block-container {{ padding-left: 1rem !important; padding-right:1rem !important; }}
+}}
+
+/* File Uploader Fixes */
+[data-testid='stFileUploader'] section {{
+    background-color: var(--card-bg) !important;
+    border: 1px dashed var(--border-color) !important;
+}}
+[data-testid='stFileUploader'] section > div {{
+    color: var(--text-secondary) !important;
+}}
+[data-testid='stFileUploader'] section small {{
+    color: var(--text-secondary) !important;
+}}
+[data-testid='stFileUploader'] button {{
+    background-color: var(--accent) !important;
+    color: white !important;
+    border: none !important;
+}}
+</style>
+"""
+
+
+CSS_VARS = {"dark": DARK_CSS_VARS, "light": LIGHT_CSS_VARS}
+PAGE_CSS = {theme: _page_css(css_vars) for theme, css_vars in CSS_VARS.items()}
+# The toggle offers the other theme
+TOGGLE_LABELS = {"dark": "☀️ Light Mode", "light": "🌙 Dark Mode"}
@@ -0,0 +1,126 @@
+"""OCR of very large images in horizontal strips.
+
+Huge scans and stitched screenshots are slow as a single Tesseract job and can
+hold several copies of the full bitmap at once. ``ocr_tiled`` works on one
+grayscale copy, cuts it into strips (at blank rows where there are any, with an
+overlap where a cut has to go through text), OCRs the strips in parallel and
+joins the lines, dropping the ones repeated in an overlap.
+
+``memory_mb`` caps the decoded image plus the strips in flight. A quarter of it
+goes to the grayscale image (preprocessing makes a few working copies): JPEGs are
+decoded at a reduced scale (``Image.draft``) when the full image would not fit,
+images that are still too big are scaled down, and the number of strips OCR'd
+at once is limited to what fits in the rest of the budget. Other formats have to
+be decoded in full once; they are converted to grayscale right away.
+"""
+import difflib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from ocr_engines import get_engine
+from preprocess import binarize, prepare, row_ink
+
+# Images with more pixels than this are OCR'd in strips
+TILE_MIN_PIXELS = int(os.getenv("DEBAI_TILE_MIN_PIXELS", str(16_000_000)))
+OCR_MEMORY_MB = int(os.getenv("DEBAI_OCR_MEMORY_MB", "1024"))
+STRIP_HEIGHT = 1600
+STRIP_OVERLAP = 120
+STRIP_WORKERS = min(4, os.cpu_count() or 1)
+# Rough peak bytes per strip pixel while Tesseract works on it (its own copies,
+# binarized and scaled images, layout analysis)
+_OCR_BYTES_PER_PIXEL = 8
+
+_MB = 1024 * 1024
+
+
+def needs_tiling(image):
+    return image.width * image.height >= TILE_MIN_PIXELS
+
+
+def load_gray(data, memory_mb=OCR_MEMORY_MB):
+    """Decode ``data`` as a grayscale image that fits in a quarter of ``memory_mb``."""
+    budget = memory_mb * _MB // 4
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    if image.format == "JPEG" and width * height > budget:
+        # libjpeg can decode straight to grayscale at 1/2, 1/4 or 1/8 scale
+        scale = (budget / float(width * height)) ** 0.5
+        image.draft("L", (int(width * scale), int(height * scale)))
+    image = ImageOps.exif_transpose(image)
+    gray = ImageOps.grayscale(image)
+    del image
+    if gray.width * gray.height > budget:
+        scale = (budget / float(gray.width * gray.height)) ** 0.5
+        gray = gray.resize((int(gray.width * scale), int(gray.height * scale)), Image.BOX)
+    return gray
+
+
+def strip_boxes(image, height=STRIP_HEIGHT, overlap=STRIP_OVERLAP):
+    """``(left, top, right, bottom)`` boxes covering ``image`` top to bottom."""
+    if image.height <= height:
+        return [(0, 0, image.width, image.height)]
+    # blank rows are found on a narrow binarized copy
+    probe = image.resize((min(image.width, 1000), image.height), Image.BOX)
+    rows = row_ink(binarize(probe, 15, 10))
+    cuts = [0]
+    while image.height - cuts[-1] > height:
+        nominal = cuts[-1] + height - overlap
+        window = range(max(cuts[-1] + 1, nominal - overlap), min(image.height, nominal + overlap))
+        # cut at the lightest row near the nominal position
+        cuts.append(max(window, key=lambda y: (rows[y], -abs(y - nominal))))
+    cuts.append(image.height)
+    boxes = []
+    for i, (top, bottom) in enumerate(zip(cuts, cuts[1:])):
+        # a cut through ink may slice a line in two; overlap so it is whole in one strip
+        if i > 0 and rows[top] < 254:
+            top = max(0, top - overlap)
+        if i < len(cuts) - 2 and rows[bottom] < 254:
+            bottom = min(image.height, bottom + overlap)
+        boxes.append((0, top, image.width, bottom))
+    return boxes
+
+
+def _same_line(a, b):
+    a, b = " ".join(a.split()), " ".join(b.split())
+    return a == b or difflib.SequenceMatcher(None, a, b).ratio() >= 0.85
+
+
+def merge_strips(texts, overlapped=None, max_overlap_lines=3):
+    """Join strip texts, dropping lines repeated at the start of the next strip.
+
+    ``overlapped[i]`` says whether strip ``i`` overlaps the one before it; strips
+    cut at a blank row are joined as they are.
+    """
+    merged = []
+    for i, text in enumerate(texts):
+        lines = [line for line in text.splitlines() if line.strip()]
+        drop = 0
+        check = len(merged) if overlapped is None or overlapped[i] else 0
+        for n in range(min(max_overlap_lines, len(lines), check), 0, -1):
+            if all(_same_line(x, y) for x, y in zip(merged[-n:], lines[:n])):
+                drop = n
+                break
+        merged.extend(lines[drop:])
+    return "\n".join(merged)
+
+
+def ocr_tiled(data, preprocess_options=None, memory_mb=OCR_MEMORY_MB, max_workers=STRIP_WORKERS, engine=None):
+    engine = engine or get_engine()
+    image = load_gray(data, memory_mb)
+    if preprocess_options is not None:
+        image = prepare(image, preprocess_options)
+    boxes = strip_boxes(image)
+    image_bytes = image.width * image.height
+    strip_bytes = image.width * STRIP_HEIGHT * _OCR_BYTES_PER_PIXEL
+    workers = max(1, min(max_workers, len(boxes), (memory_mb * _MB - image_bytes) // strip_bytes))
+    if workers == 1:
+        texts = [engine.image_to_text(image.crop(box)) for box in boxes]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="debai-strip") as pool:
+            # crops are made by the workers, so only `workers` strips exist at a time
+            texts = list(pool.map(lambda box: engine.image_to_text(image.crop(box)), boxes))
+    overlapped = [False] + [box[1] < prev[3] for prev, box in zip(boxes, boxes[1:])]
+    return merge_strips(texts, overlapped)